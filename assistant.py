@@ -1,30 +1,54 @@
 import io
 import cmd
 import time
+import datetime
 import tkinter as tk
 
 from multiprocessing import Queue
 from tkinter import scrolledtext
 
+from protocol import Client, Response
+from telemetry import TelemetryReader
+
+
+# 收取回复的间隔(毫秒)
+POLL_INTERVAL = 20
+# watch命令默认的刷新间隔(毫秒)
+WATCH_INTERVAL = 1000
+
 
 class Assistant(cmd.Cmd):
-    def __init__(self, stdout, queue1, queue2, prompt='(user) ', intro='欢迎使用合成校徽辅助命令行界面', parent=None):
+    def __init__(self, stdout, queue1, queue2, prompt='(user) ', intro='欢迎使用合成校徽辅助命令行界面', parent=None,
+                 telemetry_name=None):
         super().__init__(stdout=stdout)
         self.parent = parent
         self.prompt = prompt
         self.send_queue = queue1
         self.receive_queue = queue2
+        self.client = Client(queue1, queue2)
+        self.telemetry = TelemetryReader(telemetry_name) if telemetry_name else None
+        self.watch_job = None
         self.intro = intro
 
+    def request(self, command, on_result, **args):
+        """ 发送请求，收到回复后调用on_result，失败或超时时输出错误 """
+        def callback(response: Response):
+            if response.ok:
+                on_result(response.result)
+            elif response.error == 'timeout':
+                self.stdout.write(f'{command} 请求超时，游戏没有响应\n')
+            else:
+                self.stdout.write(f'{command} 失败: {response.error}\n')
+
+        self.client.request(command, callback, **args)
+
     def do_pause(self, arg):
         '暂停游戏'
-        self.send_queue.put('pause')
-        self.stdout.write('游戏已暂停\n')
+        self.request('pause', lambda _: self.stdout.write('游戏已暂停\n'))
     
     def do_resume(self, arg):
         '恢复游戏'
-        self.send_queue.put('resume')
-        self.stdout.write('游戏已恢复\n')
+        self.request('resume', lambda _: self.stdout.write('游戏已恢复\n'))
     
     def do_exit(self, arg):
         '处理退出游戏的命令。如果参数是 cmd，它将然后退出当前命令行。无参数以及其他参数将退出游戏。'
@@ -36,36 +60,126 @@ class Assistant(cmd.Cmd):
             time.sleep(1.5)
             self.parent.root.quit()
         else:
-            self.send_queue.put('exit')
-            self.stdout.write('游戏已退出\n')
+            self.request('exit', lambda _: self.stdout.write('游戏已退出\n'))
     
     def do_save(self, arg):
         '保存当前游戏'
-        self.send_queue.put('save')
-        self.stdout.write('游戏已保存\n')
+        self.request('save', lambda filename: self.stdout.write(f'游戏已保存: {filename}\n'))
     
     def do_load(self, arg):
         '加载游戏'
         if len(arg) == 0:
             self.stdout.write('请提供一个存档名\n')
-        self.send_queue.put('load')
-        self.send_queue.put(arg)
-        self.stdout.write('游戏已加载\n')
+            return
+        self.request('load', lambda _: self.stdout.write('游戏已加载\n'), filename=arg)
     
     def do_show_save(self, arg):
         '检测存档'
-        self.send_queue.put('show_save')
         self.stdout.write('存档检测中......\n')
+        self.request('show_save', self.print_saves)
 
-        saves = self.receive_queue.get()
+    def print_saves(self, saves):
         if len(saves) == 0:
             self.stdout.write('没有存档\n')
             return
-        else:
-            saves = ' '.join(saves)
 
-        self.stdout.write(saves + '\n')
+        for save in saves:
+            saved_at = datetime.datetime.fromtimestamp(save['time']).strftime('%Y-%m-%d %H:%M')
+            self.stdout.write(
+                f"{save['filename']}  分数: {save['score']}  徽章: {save['badges']}  "
+                f"{saved_at}  {save['bytes']}B  v{save['version']}\n"
+            )
+
+    def do_save_stats(self, arg):
+        '显示后台存档的写入统计'
+        self.request('save_stats', self.print_save_stats)
+
+    def print_save_stats(self, stats):
+        self.stdout.write(
+            f"提交 {stats['submitted']}  写入 {stats['written']}  合并 {stats['coalesced']}  失败 {stats['failed']}\n"
+            f"快照 {stats['last_snapshot_ms']:.2f}ms  写入 {stats['last_write_ms']:.2f}ms  "
+            f"延迟 {stats['last_latency_ms']:.2f}ms  最大延迟 {stats['max_latency_ms']:.2f}ms\n"
+        )
+
+    def do_latency(self, arg):
+        '显示命令往返延迟'
+        stats = self.client.stats()
+        self.stdout.write(
+            f"请求 {stats['requests']}  等待中 {stats['pending']}  超时 {stats['timeouts']}\n"
+            f"平均 {stats['mean_ms']:.1f}ms  p50 {stats['p50_ms']:.1f}ms  "
+            f"p95 {stats['p95_ms']:.1f}ms  最大 {stats['max_ms']:.1f}ms\n"
+        )
     
+    def do_profile(self, arg):
+        '显示最近各帧每个区段的耗时分位数，profile dump <文件名> 同时导出逐帧数据'
+        params = arg.split()
+        dump = params[1] if len(params) == 2 and params[0] == 'dump' else None
+        self.request('profile', self.print_profile, dump=dump)
+
+    def print_profile(self, profile):
+        self.stdout.write(f"最近 {profile['frames']} 帧 (ms)\n")
+        for name, stats in profile['sections'].items():
+            self.stdout.write(
+                f"{name:<16}p50 {stats['p50']:.2f}  p95 {stats['p95']:.2f}  "
+                f"p99 {stats['p99']:.2f}  max {stats['max']:.2f}\n"
+            )
+        if 'dumped' in profile:
+            self.stdout.write(f"已导出 {profile['dumped']} 帧\n")
+
+    def do_leaderboard(self, arg):
+        '显示排行榜，leaderboard [页码] [用户id]'
+        params = arg.split()
+        if not all(param.isdigit() for param in params) or len(params) > 2:
+            self.stdout.write('用法: leaderboard [页码] [用户id]\n')
+            return
+        page = int(params[0]) if params else 1
+        user_id = int(params[1]) if len(params) == 2 else None
+        self.request('leaderboard', self.print_leaderboard, page=page, user_id=user_id)
+
+    def print_leaderboard(self, entries):
+        if len(entries) == 0:
+            self.stdout.write('没有记录\n')
+            return
+
+        for entry in entries:
+            self.stdout.write(f"{entry['rank']:>3}. {entry['name']:<8}{entry['value']:>6}  {entry['record_time']}\n")
+
+    def do_stats(self, arg):
+        '显示游戏运行数据，直接读取共享内存，不发送任何消息'
+        stats = self.telemetry.read() if self.telemetry else None
+        if stats is None:
+            self.stdout.write('游戏未运行\n')
+            return
+
+        self.stdout.write(
+            f"帧 {stats.frame}  分数 {stats.score}{'  (暂停)' if stats.paused else ''}\n"
+            f"徽章 {stats.players + stats.others} (玩家 {stats.players}, 休眠 {stats.sleeping})  粒子 {stats.particles}\n"
+            f"物理 {stats.physics_ms:.2f}ms  绘制 {stats.draw_ms:.2f}ms  FPS {stats.fps:.1f}\n"
+        )
+
+    def do_watch(self, arg):
+        '持续显示游戏运行数据，参数为刷新间隔(毫秒)，watch off 停止'
+        if self.watch_job is not None:
+            self.parent.root.after_cancel(self.watch_job)
+            self.watch_job = None
+        if arg.strip() == 'off':
+            return
+
+        # *间隔为0时after会变成忙循环，只接受正整数
+        try:
+            interval = int(arg) if arg.strip() else WATCH_INTERVAL
+        except ValueError:
+            interval = 0
+        if interval <= 0:
+            self.stdout.write('用法: watch [刷新间隔(毫秒)，正整数] | watch off\n')
+            return
+
+        def watch():
+            self.do_stats('')
+            self.watch_job = self.parent.root.after(interval, watch)
+
+        watch()
+
     def do_login(self, arg):
         '登录'
         if len(arg) == 0:
@@ -84,7 +198,7 @@ class RedirectText(io.StringIO):
         self.text_ctrl.see(tk.END)
 
 class App:
-    def __init__(self, root, queue1, queue2):
+    def __init__(self, root, queue1, queue2, telemetry_name=None):
         self.root: tk.Tk = root
 
         self.root.geometry('300x600+100+100')
@@ -106,17 +220,25 @@ class App:
         self.entry.configure(font=("Source Code Pro", 11))
         self.button.configure(font=("Source Code Pro", 11))
 
-        self.cmd = Assistant(self.redirectorO, queue1, queue2, parent=self)
+        self.cmd = Assistant(self.redirectorO, queue1, queue2, parent=self, telemetry_name=telemetry_name)
 
         self.entry.bind('<Return>', lambda event: self.execute_command())
 
+        self.poll()
+
     def execute_command(self):
         command = self.entry.get()
         if command:
             self.text_area.insert(tk.END, f"{self.cmd.prompt}{command}\n")
             self.cmd.onecmd(command)
+            self.cmd.client.flush()
             self.entry.delete(0, tk.END)
 
-def run(queue1: Queue, queue2: Queue):
-    app = App(tk.Tk(), queue1, queue2)
+    def poll(self):
+        """ 在Tk主循环中定期收取游戏的回复 """
+        self.cmd.client.poll()
+        self.root.after(POLL_INTERVAL, self.poll)
+
+def run(queue1: Queue, queue2: Queue, telemetry_name=None):
+    app = App(tk.Tk(), queue1, queue2, telemetry_name)
     app.root.mainloop()
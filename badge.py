@@ -1,18 +1,80 @@
 import random
 import arcade
+import PIL.Image
 
 from config import *
 
-class BadgeSprite(arcade.SpriteCircle):
-    def __init__(self, scale=BADGE_SCALE, radius=BADGE_RADIUS, color=(0, 0, 0, 0), soft=False, size=-1, img_path=None):
-        super().__init__(radius, color, soft)
-        
-        ss_map = {
-            1: 1,
-            2: 1.2,
-            3: 1.5
+
+class TextureCache:
+    """ 进程内共享的纹理缓存，徽章图片按 (img_path, size) 预先缩放好，避免生成徽章时读盘和创建新纹理 """
+
+    def __init__(self):
+        self.textures = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, img_path, size):
+        """ 获取预缩放的徽章纹理 """
+        return self._get((img_path, size), self._load_badge)
+
+    def get_body(self, radius, color=(0, 0, 0, 0), soft=False):
+        """ 获取物理碰撞体使用的圆形纹理 """
+        return self._get(("body", radius, tuple(color), soft), self._load_body)
+
+    def warm(self, img_paths=RANDOM_BADGE, sizes=SIZE_SCALE):
+        """ 预先加载所有徽章纹理，不计入命中统计 """
+        for img_path in img_paths:
+            for size in sizes:
+                key = (img_path, size)
+                if key not in self.textures:
+                    self.textures[key] = self._load_badge(key)
+        key = ("body", BADGE_RADIUS, (0, 0, 0, 0), False)
+        if key not in self.textures:
+            self.textures[key] = self._load_body(key)
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "textures": len(self.textures),
         }
 
+    def _get(self, key, loader):
+        texture = self.textures.get(key)
+        if texture is None:
+            self.misses += 1
+            texture = self.textures[key] = loader(key)
+        else:
+            self.hits += 1
+        return texture
+
+    @staticmethod
+    def _load_badge(key):
+        img_path, size = key
+        image = PIL.Image.open(img_path).convert("RGBA")
+        scale = BADGE_SCALE * SIZE_SCALE[size]
+        image = image.resize(
+            (max(1, round(image.width * scale)), max(1, round(image.height * scale))),
+            PIL.Image.LANCZOS
+        )
+        return arcade.Texture(f"badge:{img_path}:{size}", image, hit_box_algorithm="None")
+
+    @staticmethod
+    def _load_body(key):
+        _, radius, color, soft = key
+        name = f"badge_body:{radius}:{color}:{soft}"
+        if soft:
+            return arcade.make_soft_circle_texture(radius * 2, color, name=name)
+        return arcade.make_circle_texture(radius * 2, color, name=name)
+
+
+texture_cache = TextureCache()
+
+
+class BadgeSprite(arcade.Sprite):
+    def __init__(self, scale=BADGE_SCALE, radius=BADGE_RADIUS, color=(0, 0, 0, 0), soft=False, size=-1, img_path=None):
+        super().__init__(texture=texture_cache.get_body(radius, color, soft), hit_box_algorithm="None")
+
         if size > 0:
             self.size = size
         elif (size := random.random()) <= 0.6:
@@ -22,11 +84,11 @@ class BadgeSprite(arcade.SpriteCircle):
         else:
             self.size = 3
 
-        sscale = ss_map[self.size]
+        sscale = SIZE_SCALE[self.size]
 
         radius *= sscale
-
-        self._hit_box_algorithm = "Detailed"
+        # *物理引擎中使用该半径的圆形
+        self.body_radius = radius
 
         self.left = random.uniform(int(radius), int(WINDOW_WIDTH - radius))
         self.top = WINDOW_HEIGHT + 100
@@ -42,20 +104,16 @@ class BadgeSprite(arcade.SpriteCircle):
         ])
         # self.set_hit_box(self.get_adjusted_hit_box())
 
-        self.img_path = img_path if img_path else random.choice(RANDOM_BADGE) 
-        self.visual_badge = arcade.Sprite(self.img_path, scale=scale*sscale, hit_box_algorithm="None")
-
-    def draw_visual(self):
-        self.visual_badge.center_x = self.center_x
-        self.visual_badge.center_y = self.center_y
-
-        if self.rotate:
-            self.visual_badge.angle += ROTATION_SPEED
-        self.visual_badge.draw()
+        self.img_path = img_path if img_path else random.choice(RANDOM_BADGE)
+        # *纹理已按BADGE_SCALE预缩放，这里只需补上剩余的比例
+        self.visual_badge = arcade.Sprite(
+            texture=texture_cache.get(self.img_path, self.size),
+            scale=scale / BADGE_SCALE,
+            hit_box_algorithm="None"
+        )
 
 
 class OtherBadge(BadgeSprite):
     def __init__(self, scale=BADGE_SCALE, size=-1, img_path=None):
         super().__init__(scale=scale, size=size, img_path=img_path)
         self.rotate = False
-
@@ -0,0 +1,78 @@
+import time
+import argparse
+
+from utils import ConnectionManager, UtilDatabase
+
+
+def legacy_insert(cursor, data_name, data):
+    """ 加入语句缓存之前的做法：每次调用都重新拼接SQL """
+    command = f"INSERT INTO {data_name} " + str(tuple(data.keys())).replace("'", "") + \
+        " VALUES (" + "?," * (len(data) - 1) + "?)"
+    cursor.execute(command, [data[key] for key in data.keys()])
+
+
+def legacy_update(cursor, data_name, data, condition):
+    set_clause = ", ".join([f"{key} = ?" for key in data.keys()])
+    where_clause = " AND ".join([f"{key} = ?" for key in condition.keys()])
+    cursor.execute(f"UPDATE {data_name} SET {set_clause} WHERE {where_clause}",
+                   list(data.values()) + list(condition.values()))
+
+
+def legacy_select(cursor, data_name, fields, condition):
+    command = f"SELECT {', '.join(fields)} FROM {data_name} WHERE " + \
+        " AND ".join([f"{key} = ?" for key in condition.keys()])
+    cursor.execute(command, (*condition.values(),))
+    return cursor.fetchall()
+
+
+def measure(func, n):
+    start = time.perf_counter()
+    for i in range(n):
+        func(i)
+    return (time.perf_counter() - start) / n * 1e6
+
+
+def run(n: int):
+    """ 在内存数据库上测量每次调用的开销(微秒)，返回 {操作: {实现: 耗时}} """
+    manager = ConnectionManager(":memory:")
+    cursor = manager.cursor()
+    fields = {"user_id": "INTEGER", "value": "INTEGER", "record_time": "TEXT"}
+    UtilDatabase.create_table(cursor, "record", fields)
+    # *update和select在一张小表上测量，避免全表扫描掩盖语句本身的开销
+    UtilDatabase.create_table(cursor, "small", fields)
+    cursor.executemany("INSERT INTO small VALUES (?, ?, ?)", [(i, i, "t") for i in range(10)])
+
+    row = lambda i: {"user_id": i % 100, "value": i, "record_time": "t"}
+    results = {
+        "insert": {
+            "cached": measure(lambda i: UtilDatabase.insert_data(cursor, "record", row(i)), n),
+            "legacy": measure(lambda i: legacy_insert(cursor, "record", row(i)), n),
+            "raw": measure(lambda i: cursor.execute(
+                "INSERT INTO record (user_id, value, record_time) VALUES (?, ?, ?)", (i % 100, i, "t")), n),
+        },
+        "update": {
+            "cached": measure(lambda i: UtilDatabase.update_data(
+                cursor, "small", {"value": i, "record_time": "t"}, {"user_id": 3}), n),
+            "legacy": measure(lambda i: legacy_update(
+                cursor, "small", {"value": i, "record_time": "t"}, {"user_id": 3}), n),
+            "raw": measure(lambda i: cursor.execute(
+                "UPDATE small SET value = ?, record_time = ? WHERE user_id = ?", (i, "t", 3)), n),
+        },
+        "select": {
+            "cached": measure(lambda i: UtilDatabase.select_data(cursor, "small", ["value"], {"user_id": 3}), n),
+            "legacy": measure(lambda i: legacy_select(cursor, "small", ["value"], {"user_id": 3}), n),
+            "raw": measure(lambda i: cursor.execute(
+                "SELECT value FROM small WHERE user_id = ?", (3,)).fetchall(), n),
+        },
+    }
+    manager.close_all()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="测量UtilDatabase每次调用的开销")
+    parser.add_argument("-n", type=int, default=50000)
+    args = parser.parse_args()
+
+    for name, timings in run(args.n).items():
+        print(f"{name:<8}" + "  ".join(f"{kind} {us:.2f}us" for kind, us in timings.items()))
@@ -0,0 +1,74 @@
+import os
+import time
+import random
+import argparse
+
+import arcade
+
+from config import *
+from badge import OtherBadge
+from headless import HeadlessGame
+
+
+def legacy_clear(game, explosion_center, radius):
+    """ 改用EntityStore之前的做法：遍历场景中所有非平台sprite逐个计算距离 """
+    res = []
+    for sprite_list in game.scene.sprite_lists:
+        if sprite_list == game.scene['Platform']:
+            continue
+        for sprite in sprite_list:
+            distance = arcade.get_distance(*explosion_center, sprite.center_x, sprite.center_y)
+            if distance <= radius:
+                res.append(sprite)
+    return res
+
+
+def current_clear(game, explosion_center, radius):
+    game.check_sprites_in_explosion_radius(explosion_center, radius)
+    res = list(game.sprites_to_remove)
+    game.sprites_to_remove.clear()
+    return res
+
+
+def run(badges: int, explosions: int, radius: float, seed=None):
+    """ 在场景中放入badges个徽章，测量每次爆炸清除的耗时(毫秒)，并核对两种做法的结果一致 """
+    file_path = os.path.dirname(os.path.abspath(__file__))
+    os.chdir(file_path)
+
+    game = HeadlessGame(seed)
+    game.setup()
+    rng = random.Random(seed)
+    for _ in range(badges):
+        badge = OtherBadge()
+        badge.center_x = rng.uniform(0, WINDOW_WIDTH)
+        badge.center_y = rng.uniform(0, WINDOW_HEIGHT)
+        game.sprites_to_add.append(badge)
+    game.process_sprites()
+
+    centers = [(rng.uniform(0, WINDOW_WIDTH), rng.uniform(0, WINDOW_HEIGHT)) for _ in range(explosions)]
+    stats = {"badges": len(game.entities), "radius": radius}
+    results = {}
+    for name, clear in (("legacy", legacy_clear), ("current", current_clear)):
+        start = time.perf_counter()
+        results[name] = [set(clear(game, center, radius)) for center in centers]
+        stats[f"{name}_ms"] = (time.perf_counter() - start) / explosions * 1000
+
+    stats["hits"] = sum(len(res) for res in results["current"]) / explosions
+    stats["match"] = results["legacy"] == results["current"]
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="测量爆炸清除范围内徽章的耗时")
+    parser.add_argument("--badges", type=int, default=1000)
+    parser.add_argument("--explosions", type=int, default=500)
+    parser.add_argument("--radius", type=float, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    stats = run(args.badges, args.explosions, args.radius, args.seed)
+    print(
+        f"{stats['badges']} badges, radius {stats['radius']:.0f}, {stats['hits']:.1f} cleared per explosion: "
+        f"legacy {stats['legacy_ms']:.3f} ms, current {stats['current_ms']:.3f} ms, "
+        f"results {'match' if stats['match'] else 'differ'}"
+    )
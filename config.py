@@ -13,16 +13,65 @@ SYNTHESIS_SOUND_PATH = "assets/sounds/synthesis.mp3"
 SPEEDUP_SOUND_PATH = "assets/sounds/speedup.mp3"
 COLLIDE_SOUND_PATH = "assets/sounds/collide.mp3"
 
+# 解码后的音频缓存目录
+SOUND_CACHE_DIR = ".cache/sounds"
+
+# 存档目录以及最多保留的存档数
+SAVE_DIR = "save"
+SAVE_SLOTS = 5
+SAVE_EXT = ".sav"
+# 等待后台存档写完的最长秒数
+SAVE_FLUSH_TIMEOUT = 5.0
+
+# 游戏运行数据共享内存名的前缀，实际名字后接启动进程的pid
+TELEMETRY_NAME = "badge_synthesis_telemetry"
+
+# 数据库文件，以及等待其他连接释放写锁的秒数
+DATABASE_PATH = "aaa.db"
+DATABASE_TIMEOUT = 5.0
+
+# 分数记录在后台批量写入数据库：攒够多少条或距上次写入多少秒就写一次
+RECORD_BATCH_SIZE = 64
+RECORD_FLUSH_INTERVAL = 2.0
+# 未登录时记录分数使用的用户id
+GUEST_USER_ID = 0
+
+# 排行榜在内存中缓存的名次数，以及每页显示的名次数
+LEADERBOARD_SIZE = 100
+LEADERBOARD_PAGE_SIZE = 10
+
+# 性能分析保留的帧数
+PROFILE_FRAMES = 600
+
 PLATFORM_SCALE = 0.5
 PLATFORM_HEIGHT = 0
 
 BADGE_SCALE = 0.2
 BADGE_RADIUS = int(256 * BADGE_SCALE // 2)
 
+# 徽章大小等级对应的缩放倍数
+SIZE_SCALE = {
+    1: 1,
+    2: 1.2,
+    3: 1.5
+}
+
 VERTICAL_SPEEDUP = 20
 
 GRAVITY = 1500
 
+# 徽章速度低于BADGE_IDLE_SPEED并持续BADGE_SLEEP_TIME秒(模拟时间)后休眠
+# !下落速度被限制在HORIZONTAL_SPEED(20)，BADGE_IDLE_SPEED必须远小于它，否则徽章会在空中休眠
+BADGE_SLEEP_TIME = 1.0
+BADGE_IDLE_SPEED = 5
+
+# 固定步长的物理模拟：每个tick对应PHYSICS_TICK秒真实时间，推进PHYSICS_STEP的模拟时间
+PHYSICS_TICK = 1 / FPS
+PHYSICS_STEP = 0.2
+PHYSICS_SUBSTEPS = 1
+# 卡顿后单帧最多追赶的tick数，超出的时间直接丢弃
+MAX_CATCHUP_TICKS = 5
+
 DEFAULT_DAMPING = 0.9
 PLAYER_DAMPING = 0.4
 
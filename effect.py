@@ -1,36 +1,137 @@
-import random
 import arcade
 import arcade.color
+import numpy as np
 
-class Particle(arcade.SpriteCircle):
-    def __init__(self, position, velocity, lifetime, color):
-        super().__init__(radius=3, color=color)
-        self.position = position
-        self.velocity = velocity
-        self.lifetime = lifetime
+from arcade.gl import BufferDescription
 
-    def update(self):
-        super().update()
-        self.lifetime -= 1
-        if self.lifetime <= 0:
-            self.remove_from_sprite_lists()
 
 class Effect:
+    """ 一次粒子特效的描述，粒子本身由ParticleSystem统一存放 """
     def __init__(self, position, particle_count, color, lifetime=(30, 50)):
-        self.particles = arcade.SpriteList()
         self.position = position
-        for _ in range(particle_count):
-            velocity = (random.uniform(-4, 4), random.uniform(-4, 4))
-            plifetime = random.randint(*lifetime)
-            pcolor = random.choice(color)
-            particle = Particle(position, velocity, plifetime, pcolor)
-            self.particles.append(particle)
+        self.particle_count = particle_count
+        self.color = color
+        self.lifetime = lifetime
+
+
+class ParticleSystem:
+    """ 使用预分配NumPy数组保存所有粒子，向量化更新并一次绘制 """
+
+    VERTEX_SHADER = """
+    #version 330
+
+    uniform Projection {
+        uniform mat4 matrix;
+    } proj;
+
+    uniform float point_size;
+
+    in vec2 in_pos;
+    in vec4 in_color;
+    out vec4 v_color;
+
+    void main() {
+        gl_Position = proj.matrix * vec4(in_pos, 0.0, 1.0);
+        gl_PointSize = point_size;
+        v_color = in_color;
+    }
+    """
+
+    FRAGMENT_SHADER = """
+    #version 330
+
+    in vec4 v_color;
+    out vec4 f_color;
+
+    void main() {
+        // 把方形的点裁成圆形
+        if (length(gl_PointCoord - vec2(0.5)) > 0.5) discard;
+        f_color = v_color;
+    }
+    """
+
+    def __init__(self, capacity=4096, radius=3, speed=4, seed=None):
+        self.capacity = capacity
+        self.radius = radius
+        self.speed = speed
+        self.rng = np.random.default_rng(seed)
+
+        # *存活的粒子始终紧凑地放在[0, count)中
+        self.count = 0
+        self.position = np.zeros((capacity, 2), dtype=np.float32)
+        self.velocity = np.zeros((capacity, 2), dtype=np.float32)
+        self.lifetime = np.zeros(capacity, dtype=np.int32)
+        self.color = np.zeros((capacity, 4), dtype=np.float32)
+
+        self._program = None
+        self._position_buffer = None
+        self._color_buffer = None
+        self._geometry = None
+
+    def add(self, effect: Effect):
+        """ 按特效描述发射一批粒子，超出容量的部分直接丢弃 """
+        start = self.count
+        n = min(effect.particle_count, self.capacity - start)
+        if n <= 0:
+            return
+        end = start + n
+
+        palette = np.array([(*c[:3], c[3] if len(c) > 3 else 255) for c in effect.color], dtype=np.float32) / 255
+
+        self.position[start:end] = effect.position
+        self.velocity[start:end] = self.rng.uniform(-self.speed, self.speed, (n, 2))
+        self.lifetime[start:end] = self.rng.integers(effect.lifetime[0], effect.lifetime[1], n, endpoint=True)
+        self.color[start:end] = palette[self.rng.integers(0, len(palette), n)]
+        self.count = end
 
     def update(self):
-        self.particles.update()
+        n = self.count
+        if not n:
+            return
+
+        self.position[:n] += self.velocity[:n]
+        self.lifetime[:n] -= 1
+
+        alive = self.lifetime[:n] > 0
+        if alive.all():
+            return
+
+        # *移除死亡粒子并保持数组紧凑
+        k = int(np.count_nonzero(alive))
+        for array in (self.position, self.velocity, self.lifetime, self.color):
+            array[:k] = array[:n][alive]
+        self.count = k
+
+    def clear(self):
+        self.count = 0
 
     def draw(self):
-        self.particles.draw()
+        if not self.count:
+            return
+
+        if self._geometry is None:
+            self._create_geometry()
+
+        n = self.count
+        self._position_buffer.write(self.position[:n].tobytes())
+        self._color_buffer.write(self.color[:n].tobytes())
+
+        # *ctx.point_size在arcade 2.6中设置无效，改为在着色器中写gl_PointSize
+        ctx = self._program.ctx
+        with ctx.enabled(ctx.PROGRAM_POINT_SIZE):
+            self._geometry.render(self._program, mode=ctx.POINTS, vertices=n)
+
+    def _create_geometry(self):
+        ctx = arcade.get_window().ctx
+        self._program = ctx.program(vertex_shader=self.VERTEX_SHADER, fragment_shader=self.FRAGMENT_SHADER)
+        self._program["point_size"] = self.radius * 2
+        self._position_buffer = ctx.buffer(reserve=self.position.nbytes)
+        self._color_buffer = ctx.buffer(reserve=self.color.nbytes)
+        self._geometry = ctx.geometry([
+            BufferDescription(self._position_buffer, "2f", ["in_pos"]),
+            BufferDescription(self._color_buffer, "4f", ["in_color"]),
+        ])
+
 
 class ExplosionEffect(Effect):
     def __init__(self, position, particle_count=50):
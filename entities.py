@@ -0,0 +1,156 @@
+import numpy as np
+
+
+# 标志位
+FLAG_ROTATE = 1
+# 上次同步显示以来位置有变化
+FLAG_MOVED = 2
+# 刚体处于休眠状态
+FLAG_SLEEPING = 4
+
+
+class EntityStore:
+    """
+    按列存放所有徽章的状态，存活的徽章始终紧凑地放在[0, count)中，删除时用最后一行填补。
+    位置、速度由物理引擎每步同步，存档、爆炸查询、统计和绘制都直接按列批量读取。
+    """
+
+    def __init__(self, capacity=256):
+        self.count = 0
+        self.next_id = 1
+
+        # *徽章图片表，kind列存放图片在表中的下标
+        self.kinds: list[str] = []
+        self._kind_index: dict[str, int] = {}
+
+        # *每行对应的sprite，以及sprite所在的行
+        self.sprites = []
+        self.rows = {}
+
+        self._allocate(capacity)
+
+    def _allocate(self, capacity):
+        old = self.count
+        columns = {
+            "id": np.zeros(capacity, dtype=np.int64),
+            "kind": np.zeros(capacity, dtype=np.uint16),
+            "size": np.zeros(capacity, dtype=np.uint8),
+            "role": np.zeros(capacity, dtype=np.uint8),
+            "flags": np.zeros(capacity, dtype=np.uint8),
+            "pos": np.zeros((capacity, 2), dtype=np.float32),
+            "vel": np.zeros((capacity, 2), dtype=np.float32),
+            "angle": np.zeros(capacity, dtype=np.float32),
+        }
+        for name, column in columns.items():
+            if old:
+                column[:old] = getattr(self, "_" + name)[:old]
+            setattr(self, "_" + name, column)
+        self.capacity = capacity
+
+    # *只读视图，只包含存活的徽章
+    id = property(lambda self: self._id[:self.count])
+    kind = property(lambda self: self._kind[:self.count])
+    size = property(lambda self: self._size[:self.count])
+    role = property(lambda self: self._role[:self.count])
+    flags = property(lambda self: self._flags[:self.count])
+    pos = property(lambda self: self._pos[:self.count])
+    vel = property(lambda self: self._vel[:self.count])
+    angle = property(lambda self: self._angle[:self.count])
+
+    def __len__(self):
+        return self.count
+
+    def kind_index(self, img_path) -> int:
+        index = self._kind_index.get(img_path)
+        if index is None:
+            index = self._kind_index[img_path] = len(self.kinds)
+            self.kinds.append(img_path)
+        return index
+
+    def add(self, sprite, role) -> int:
+        if self.count == self.capacity:
+            self._allocate(self.capacity * 2)
+
+        row = self.count
+        self.count += 1
+        self.sprites.append(sprite)
+        self.rows[sprite] = row
+
+        self._id[row] = self.next_id
+        self._kind[row] = self.kind_index(sprite.img_path)
+        self._size[row] = sprite.size
+        self._role[row] = role
+        self._flags[row] = FLAG_MOVED | (FLAG_ROTATE if sprite.rotate else 0)
+        self._pos[row] = sprite.position
+        self._vel[row] = 0
+        self._angle[row] = sprite.visual_badge.angle
+
+        self.next_id += 1
+        return self._id[row]
+
+    def remove(self, sprite):
+        row = self.rows.pop(sprite, None)
+        if row is None:
+            return
+
+        last = self.count - 1
+        if row != last:
+            # *用最后一行填补空位
+            moved = self.sprites[last]
+            self.sprites[row] = moved
+            self.rows[moved] = row
+            for column in (self._id, self._kind, self._size, self._role, self._flags, self._pos, self._vel, self._angle):
+                column[row] = column[last]
+        self.sprites.pop()
+        self.count = last
+
+    def row(self, sprite):
+        return self.rows.get(sprite)
+
+    def set_flag(self, sprite, flag, on=True):
+        row = self.rows.get(sprite)
+        if row is None:
+            return
+        if on:
+            self._flags[row] |= flag
+        else:
+            self._flags[row] &= 0xFF ^ flag
+
+    def update_rows(self, rows, positions, velocities):
+        """ 由物理引擎每步调用一次，传入所有未休眠刚体的行、位置和速度，其余的行视为休眠 """
+        flags = self.flags
+        flags |= FLAG_SLEEPING
+        if not rows:
+            return
+        rows = np.fromiter(rows, dtype=np.intp, count=len(rows))
+        self._pos[rows] = positions
+        self._vel[rows] = velocities
+        flags[rows] = (flags[rows] & (0xFF ^ FLAG_SLEEPING)) | FLAG_MOVED
+
+    def take_moved(self) -> np.ndarray:
+        """ 返回自上次调用以来位置有变化的行，并清除标志 """
+        flags = self.flags
+        rows = np.flatnonzero(flags & FLAG_MOVED)
+        flags[rows] &= 0xFF ^ FLAG_MOVED
+        return rows
+
+    def query_radius(self, center, radius, size=None) -> np.ndarray:
+        """ 返回中心点在给定半径内的行，可以只查某个大小的徽章 """
+        delta = self.pos - np.asarray(center, dtype=np.float32)
+        mask = np.einsum("ij,ij->i", delta, delta) <= radius * radius
+        if size is not None:
+            mask &= self.size == size
+        return np.flatnonzero(mask)
+
+    def count_by(self, column, minlength=0) -> np.ndarray:
+        """ 按某一列统计数量，例如 count_by("role")、count_by("size") """
+        return np.bincount(getattr(self, column), minlength=minlength)
+
+    def count_flag(self, flag) -> int:
+        """ 带有某个标志的徽章数，例如 count_flag(FLAG_SLEEPING) """
+        return int(np.count_nonzero(self.flags & flag))
+
+    def clear(self):
+        self.count = 0
+        self.sprites.clear()
+        self.rows.clear()
@@ -1,75 +1,92 @@
 import os
-import pickle
+import time
 import random
 import datetime
 
 import arcade
+import numpy as np
 
 from config import *
 from multiprocessing import Queue
-from badge import BadgeSprite, OtherBadge
-from effect import ExplosionEffect, SynthesisEffect
-
-
-class Game(arcade.Window):
-    def __init__(self, queue1, queue2):
-        super().__init__(WINDOW_WIDTH, WINDOW_HEIGHT, WINDOW_TITLE, update_rate=1/FPS)
-        
-        file_path = os.path.dirname(os.path.abspath(__file__))
-        os.chdir(file_path)
-
+from badge import BadgeSprite, OtherBadge, texture_cache
+from effect import ExplosionEffect, SynthesisEffect, ParticleSystem
+from physics import BadgePhysicsEngine, collision_type
+from entities import EntityStore, FLAG_ROTATE, FLAG_SLEEPING
+from protocol import Server
+from telemetry import TelemetryWriter
+from profiler import FrameProfiler
+from hud import Hud
+from layer import StaticLayer
+from recorder import ScoreRecorder
+from leaderboard import Leaderboard
+from saver import SaveWriter, Snapshot, read_snapshot, ROLE_OTHER, ROLE_PLAYER, ROLE_CURRENT_PLAYER
+
+
+# 每帧计时的区段，依次为更新和绘制中的各个步骤
+PROFILE_SECTIONS = (
+    "communicate",
+    "process_sprites",
+    "physics",
+    "effects",
+    "set_velocity",
+    "draw_platform",
+    "draw_sync",
+    "draw_badges",
+    "draw_particles",
+    "draw_hud",
+)
+
+
+class GameLogic:
+    """ 不依赖窗口的游戏逻辑：物理、生成、合成、计分与爆炸，Game和无窗口模拟共用 """
+    def __init__(self):
         self.left_pressing = False
         self.right_pressing = False
         self.down_pressing = False
 
-        self.visual_bagde = None
         self.player = None
-
-        self.camera = None
-        self.gui_camera = None
+        self.paused = False
 
         self.score = 0
         # self.reset_score = True
+        # *分数变化时交给后台线程写入数据库，无窗口模拟时为None
+        self.recorder = None
 
         self.scene = None
         self.physics_engine = None
+        self.physics_accumulator = 0.0
+        self.physics_ticks = 0
+
+        self.particle_system = ParticleSystem()
 
-        self.explosion_effects: list[ExplosionEffect] = []
-        self.synthesis_effects: list[SynthesisEffect] = []
+        # *所有徽章的状态按列存放，存档、爆炸查询、统计和绘制都从这里批量读取
+        self.entities = EntityStore()
 
         self.sprites_to_add = []
         self.sprites_to_remove = []
 
-        self.send_queue = queue1
-        self.receive_queue = queue2
-        arcade.set_background_color(BACKGROUND_COLOR)
-
-
-    def setup(self):
-        # *设置相机
-        self.camera = arcade.Camera(WINDOW_WIDTH, WINDOW_HEIGHT)
-        self.gui_camera = arcade.Camera(WINDOW_WIDTH, WINDOW_HEIGHT)
+        self.save_writer = SaveWriter()
+        self.profiler = FrameProfiler(PROFILE_SECTIONS, PROFILE_FRAMES)
 
+    def setup_world(self):
+        """ 初始化场景、平台和物理引擎 """
         # *创建徽章，代表当前的玩家
         self.player = BadgeSprite()
 
         # *初始化啊scene
         self.scene = arcade.Scene()
         # self.scene.add_sprite_list("Score")
-        self.scene.add_sprite_list("Other")
-        self.scene.add_sprite_list("Platform", use_spatial_hash=True)
-        self.scene.add_sprite_list("Boundary", use_spatial_hash=True)
+        self.add_sprite_list("Other")
+        self.add_sprite_list("Platform", use_spatial_hash=True)
+        self.add_sprite_list("Boundary", use_spatial_hash=True)
 
         # *此处的Player为玩家控制的Sprite
-        self.scene.add_sprite_list("Player")
+        self.add_sprite_list("Player")
 
-        # 创建暂停按钮
+        self.particle_system.clear()
         self.paused = False
-        self.pause_button = arcade.SpriteSolidColor(100, 50, arcade.color.GRAY)
-        self.pause_button.center_x = WINDOW_WIDTH - 60
-        self.pause_button.center_y = WINDOW_HEIGHT - 30
-        self.scene.add_sprite("GUI", self.pause_button)
-        
+
+        floor, left_wall, right_wall = [], [], []
         for i in range(tmp := int(-128*PLATFORM_SCALE), WINDOW_WIDTH - tmp, int(-tmp)):
             platform = arcade.SpriteSolidColor(
                 int(128 * PLATFORM_SCALE),
@@ -80,6 +97,7 @@ class Game(arcade.Window):
             platform.center_y = 0
             
             self.scene['Platform'].append(platform)
+            floor.append(platform)
 
         for i in range(tmp := int(-128*PLATFORM_SCALE), WINDOW_HEIGHT - tmp, int(-tmp)):
             platform1 = arcade.Sprite(
@@ -96,68 +114,102 @@ class Game(arcade.Window):
             )
             self.scene['Platform'].append(platform1)
             self.scene['Platform'].append(platform2)
+            left_wall.append(platform1)
+            right_wall.append(platform2)
         
         # *初始化物理引擎
-        self.physics_engine = arcade.PymunkPhysicsEngine(damping=0.8, gravity=(0, -GRAVITY))
+        self.physics_engine = BadgePhysicsEngine(
+            damping=0.8,
+            gravity=(0, -GRAVITY),
+            sleep_time=BADGE_SLEEP_TIME,
+            idle_speed=BADGE_IDLE_SPEED,
+        )
+        self.physics_accumulator = 0.0
+        self.entities.clear()
+        self.physics_engine.entities = self.entities
 
         # *添加sprites到物理引擎
         self.sprites_to_add.append(self.player)
 
 
-        self.update_spritelist('Platform',
-                       collision_type="static",
-                       body_type=arcade.PymunkPhysicsEngine.STATIC,
-        )
+        # *平台图块只用于显示，碰撞用地面和两侧墙各一个合并后的矩形，减少形状和接触点
+        for tiles in (floor, left_wall, right_wall):
+            self.physics_engine.add_static_box(
+                min(tile.left for tile in tiles),
+                min(tile.bottom for tile in tiles),
+                max(tile.right for tile in tiles),
+                max(tile.top for tile in tiles),
+                collision_type="static",
+            )
 
         self.update_spritelist('Boundary',
                        collision_type="boundary",
                        body_type=arcade.PymunkPhysicsEngine.STATIC
         )
 
-        self.physics_engine.add_collision_handler("other", "other", post_handler=self.synthesis)
-        self.physics_engine.add_collision_handler("player", "other", post_handler=self.synthesis_player)
-        self.physics_engine.add_collision_handler("player", "player", post_handler=self.synthesis_player)
+        # *碰撞类型按(徽章图片, 大小)区分，徽章之间只有能合成的一对接触时才会调用合成回调，且只在开始接触时调用一次
+        for img_path in RANDOM_BADGE:
+            for size in SIZE_SCALE:
+                other = collision_type("other", img_path, size)
+                player = collision_type("player", img_path, size)
 
-        self.physics_engine.add_collision_handler("player", "boundary", begin_handler=lambda: False)
-        self.physics_engine.add_collision_handler("other", "boundary", begin_handler=lambda: False)
+                self.physics_engine.add_begin_handler(other, other, self.synthesis)
+                self.physics_engine.add_begin_handler(player, other, self.player_contact)
+                self.physics_engine.add_begin_handler(player, player, self.player_contact)
 
-        self.physics_engine.add_collision_handler("player", "platform", post_handler=self.stop_rotate)
+                self.physics_engine.add_collision_handler(player, "boundary", begin_handler=lambda *args: False)
+                self.physics_engine.add_collision_handler(other, "boundary", begin_handler=lambda *args: False)
 
-        # 设置计时器
-        arcade.schedule(self.generate_badge, 2)
+                # *玩家碰到任何不能合成的徽章或地面、墙时停止旋转
+                self.physics_engine.add_wildcard_begin_handler(player, self.stop_rotate)
 
-    def on_draw(self):
-        self.clear()
-        self.camera.use()
-        self.scene.draw([
-            "Platform",
-        ])
-
-        [p.draw_visual() for p in self.scene['Player'] if p]
-        [sprite.draw_visual() for sprite in self.scene['Other'] if sprite]
-        [effect.draw() for effect in self.explosion_effects]
-        [effect.draw() for effect in self.synthesis_effects]
-
-        self.gui_camera.use()
-        # self.scene.draw(["Score", ])
-        arcade.draw_text(f"Score: {self.score}", 10, 10, arcade.color.BLACK, 20)
-        arcade.draw_text("Pause" if not self.paused else "Resume", self.pause_button.center_x - 40, self.pause_button.center_y - 10, arcade.color.WHITE, 25)
-
-    def on_update(self, delta_time: float):
-        """Movement and game logic"""
-        self.communicate()
-
-        if self.paused: return
-        self.process_sprites()
-        self.physics_engine.step(delta_time=0.2)
+        # 设置计时器
+        self.unschedule(self.generate_badge)
+        self.schedule(self.generate_badge, 2)
+
+    def add_sprite_list(self, name: str, use_spatial_hash=False):
+        """ 创建延迟初始化的SpriteList，没有窗口时也可以使用 """
+        # !Scene.add_sprite_list会把空的SpriteList当作未传入而重新创建，所以这里直接登记
+        sprite_list = arcade.SpriteList(use_spatial_hash=use_spatial_hash, lazy=True)
+        self.scene.name_mapping[name] = sprite_list
+        self.scene.sprite_lists.append(sprite_list)
+
+    def schedule(self, func, interval):
+        arcade.schedule(func, interval)
+
+    def unschedule(self, func):
+        arcade.unschedule(func)
+
+    def advance(self, delta_time: float):
+        """ 按真实经过的时间推进模拟 """
+        # *固定步长推进模拟，与渲染帧率无关；卡顿时最多追赶MAX_CATCHUP_TICKS个tick
+        self.physics_accumulator += delta_time
+        ticks = 0
+        while self.physics_accumulator >= PHYSICS_TICK and ticks < MAX_CATCHUP_TICKS:
+            self.tick()
+            self.physics_accumulator -= PHYSICS_TICK
+            ticks += 1
+        if ticks == MAX_CATCHUP_TICKS:
+            self.physics_accumulator %= PHYSICS_TICK
+
+    def tick(self):
+        """ 推进一个固定步长的模拟tick """
+        profiler = self.profiler
+        with profiler.section("process_sprites"):
+            self.process_sprites()
+        with profiler.section("physics"):
+            for i in range(PHYSICS_SUBSTEPS):
+                self.physics_engine.step(
+                    delta_time=PHYSICS_STEP / PHYSICS_SUBSTEPS,
+                    resync_sprites=i == PHYSICS_SUBSTEPS - 1
+                )
 
-        for effect_list in [self.explosion_effects, self.synthesis_effects]:
-            for effect in effect_list:
-                effect.update()
-            effect_list[:] = [effect for effect in effect_list if effect.particles]
-        
+        with profiler.section("effects"):
+            self.particle_system.update()
 
-        self.set_velocity()
+        with profiler.section("set_velocity"):
+            self.set_velocity()
+        self.physics_ticks += 1
 
     def process_sprites(self):
         """ 处理需要添加和删除的sprites """
@@ -165,6 +217,8 @@ class Game(arcade.Window):
         # 处理需要删除的sprite
         for sprite in self.sprites_to_remove:
             sprite.remove_from_sprite_lists()
+            self.entities.remove(sprite)
+            self.badge_removed(sprite)
             if sprite == self.player:
                 self.player = None
                 self.generate_player()
@@ -172,43 +226,34 @@ class Game(arcade.Window):
         
         # 处理需要添加的sprite
         for sprite in self.sprites_to_add:
-            collsion_type = "player"
+            role = "player"
             if isinstance(sprite, OtherBadge):
                 self.scene['Other'].append(sprite)
-                collsion_type = "other"
+                role = "other"
             else:
                 self.scene['Player'].append(sprite)
+            collsion_type = collision_type(role, sprite.img_path, sprite.size)
+            self.entities.add(sprite, ROLE_OTHER if role == "other" else ROLE_PLAYER)
+            self.badge_added(sprite)
             self.physics_engine.add_sprite(
                 sprite=sprite,
                 collision_type=collsion_type,
+                radius=sprite.body_radius,
                 max_horizontal_velocity=HORIZONTAL_SPEED,
                 max_vertical_velocity=100,
 
             )
         self.sprites_to_add.clear()
 
-    def on_key_press(self, symbol: int, modifiers: int):
-        if symbol in (arcade.key.A, arcade.key.LEFT):
-            self.left_pressing = True
-        elif symbol in (arcade.key.D, arcade.key.RIGHT):
-            self.right_pressing = True
-        elif symbol in (arcade.key.S, arcade.key.DOWN):
-            self.down_pressing = True
-    
-    def on_key_release(self, symbol: int, modifiers: int):
-        if symbol in (arcade.key.A, arcade.key.LEFT):
-            self.left_pressing = False
-        elif symbol in (arcade.key.D, arcade.key.RIGHT):
-            self.right_pressing = False
-        elif symbol in (arcade.key.S, arcade.key.DOWN):
-            self.down_pressing = False
+    def badge_added(self, sprite):
+        """ 徽章加入场景后的回调，供子类扩展 """
 
-    def on_mouse_press(self, x, y, *args):
-        if self.pause_button.collides_with_point((x, y)):
-            self.paused = not self.paused
+    def badge_removed(self, sprite):
+        """ 徽章移出场景后的回调，供子类扩展 """
 
     def stop_rotate(self, sp1, sp2, *args):
         sp1.rotate = False        
+        self.entities.set_flag(sp1, FLAG_ROTATE, False)
 
     def generate_badge(self, *args):
         if self.paused: return
@@ -219,13 +264,13 @@ class Game(arcade.Window):
         self.sprites_to_add.append(tmp)
 
     def generate_player(self, *args):
-        arcade.schedule(self._generate_player, random.uniform(1, 3))
+        self.schedule(self._generate_player, random.uniform(1, 3))
     
     def _generate_player(self, *args):
         self.player = BadgeSprite()
         self.sprites_to_add.append(self.player)
 
-        arcade.unschedule(self._generate_player)
+        self.unschedule(self._generate_player)
 
     def set_velocity(self):
         """  更新当前player的速度 """
@@ -249,6 +294,10 @@ class Game(arcade.Window):
         self.physics_engine.add_sprite_list(self.scene[name], **kwargs)
 
     def synthesis(self, sp1, sp2, *args):
+        # *同一步内一个徽章可能同时接触多个同类徽章，已被合成的不再参与
+        if sp1 in self.sprites_to_remove or sp2 in self.sprites_to_remove:
+            return 0
+
         if sp1.img_path == sp2.img_path and sp1.size == sp2.size:
             self.sprites_to_remove.append(sp1)
             self.sprites_to_remove.append(sp2)
@@ -257,12 +306,12 @@ class Game(arcade.Window):
 
             if sp1.size == 3:
                 # 添加爆炸效果
-                self.explosion_effects.append(ExplosionEffect(center))
+                self.particle_system.add(ExplosionEffect(center))
                 self.check_sprites_in_explosion_radius(center, 200)
                 return 5
             
             # 添加合成效果
-            self.synthesis_effects.append(SynthesisEffect(center))
+            self.particle_system.add(SynthesisEffect(center))
             
             tmp = OtherBadge(size=sp1.size+1, img_path=sp1.img_path)
             tmp.center_x, tmp.center_y = center
@@ -273,130 +322,358 @@ class Game(arcade.Window):
         
         return 0
     
+    def player_contact(self, sp1, sp2, *args):
+        """ 玩家碰到可以合成的徽章：先停止旋转再合成(这一对不会再调用通配的stop_rotate) """
+        self.stop_rotate(sp1, sp2)
+        self.synthesis_player(sp1, sp2, *args)
+
     def synthesis_player(self, sp1, sp2, *args):
-        self.stop_rotate(sp1, None)
-        self.score += self.synthesis(sp1, sp2, *args)
-        self.score.__int__()
+        gained = self.synthesis(sp1, sp2, *args)
+        if gained:
+            self.score += gained
+            if self.recorder is not None:
+                self.recorder.record(self.score)
 
     def check_sprites_in_explosion_radius(self, explosion_center, radius):
         """检测并消除在爆炸半径内的所有精灵"""
-        for sprite_list in self.scene.sprite_lists:
-            if sprite_list == self.scene['Platform']:
-                continue
-            for sprite in sprite_list:
-                distance = arcade.get_distance(*explosion_center, sprite.center_x, sprite.center_y)
-                if distance <= radius:
-                    self.sprites_to_remove.append(sprite)
-
-    def on_deactivate(self):
-        self.paused = True
+        # *在EntityStore中按列批量计算距离，并跳过已在待删除列表中的sprite
+        pending = set(self.sprites_to_remove)
+        sprites = self.entities.sprites
+        for row in self.entities.query_radius(explosion_center, radius).tolist():
+            sprite = sprites[row]
+            if sprite not in pending:
+                pending.add(sprite)
+                self.sprites_to_remove.append(sprite)
 
-    def communicate(self):
-        """ 与其他进程通信 """
-        while not self.receive_queue.empty():
-            match self.receive_queue.get():
-                case "pause":
-                    self.paused = True
-                case "resume":
-                    self.paused = False
-                case "exit":
-                    arcade.close_window()
-                case "save":
-                    self.save()
-                case "show_save":
-                    self.send_queue.put(self.show_save())
-                case "load":
-                    self.load(self.receive_queue.get())
-            
     """ 保存和读取游戏状态 """
+    def snapshot(self) -> Snapshot:
+        """ 直接从EntityStore复制各列 """
+        store = self.entities
+        kinds, image = np.unique(store.kind, return_inverse=True)
+
+        role = store.role.copy()
+        if (row := store.row(self.player)) is not None:
+            role[row] = ROLE_CURRENT_PLAYER
+
+        return Snapshot(
+            score=self.score,
+            paused=self.paused,
+            images=[store.kinds[kind] for kind in kinds.tolist()],
+            role=role,
+            size=store.size.copy(),
+            image=image.astype(np.uint16),
+            x=store.pos[:, 0].copy(),
+            y=store.pos[:, 1].copy(),
+            vx=store.vel[:, 0].copy(),
+            vy=store.vel[:, 1].copy(),
+            angle=store.angle.copy(),
+            rotate=(store.flags & FLAG_ROTATE).astype(np.uint8),
+        )
+
     def save(self):
+        """ 在主线程生成快照，序列化、写入和轮换交给后台的SaveWriter """
+        start = time.perf_counter()
         # 处理add和remove的sprite
         self.process_sprites()
 
-        filename = "save" + datetime.datetime.now().strftime("%Y%m%d%H%M") + ".pkl"
-        others = []
-        for sprite in self.scene['Other']:
-            others.append({
-                "size": sprite.size,
-                "img_path": sprite.img_path,
-                "center_x": sprite.center_x,
-                "center_y": sprite.center_y,
-                "velocity": self.physics_engine.get_physics_object(sprite).body.velocity,
-            })
-        
-        status = {
-            "score": self.score,
-            "paused": self.paused,
-            "player": {
-                "size": self.player.size,
-                "img_path": self.player.img_path,
-                "center_x": self.player.center_x,
-                "center_y": self.player.center_y,
-                "angle": self.player.visual_badge.angle,
-                "velocity": self.physics_engine.get_physics_object(self.player).body.velocity,
-            },
-            "others": others,
-        }
-
-        if len(tmp := os.listdir("save")) >= 5: 
-            oldest_file = min(tmp, key=lambda x: os.path.getctime(os.path.join("save", x)))
-            os.remove(os.path.join("save", oldest_file))
-
-        with open(f"save/{filename}", "wb") as f:
-            pickle.dump(status, f)
-    
-    def show_save(self):
-        if not os.path.exists("save"):
-            os.mkdir("save")
-            return []
-
-        res = []
-        for file in os.listdir("save"):
-            if file.endswith(".pkl"):
-                res.append(file)
+        filename = "save" + datetime.datetime.now().strftime("%Y%m%d%H%M") + SAVE_EXT
+        self.save_writer.submit(filename, self.snapshot(), (time.perf_counter() - start) * 1000)
+        return filename
 
+    def profile(self, dump=None):
+        """ 返回各区段耗时的分位数，dump给出文件名时同时导出逐帧数据 """
+        res = {"frames": min(self.profiler.frames, self.profiler.capacity - 1), "sections": self.profiler.report()}
+        if dump:
+            res["dumped"] = self.profiler.dump(dump)
         return res
-    
+
+    def show_save(self):
+        """ 返回存档索引中的所有存档信息 """
+        self.save_writer.flush()
+        return self.save_writer.list_saves()
+
     def load(self, filename):
+        # *等待后台尚未写完的存档
+        self.save_writer.flush()
+        snapshot = read_snapshot(os.path.join(SAVE_DIR, filename))
+
         self.setup()
+        # *setup会生成一个随机的新玩家，读档时丢弃
+        self.sprites_to_add.clear()
+        self.player = None
 
-        with open("save\\" + filename, "rb") as f:
-            status = pickle.load(f)
-        self.score = status["score"]
-        self.paused = status["paused"]
+        self.score = snapshot.score
+        self.paused = snapshot.paused
+        # *读档后的分数算作新的一局，不覆盖读档前这一局的记录
+        if self.recorder is not None:
+            self.recorder.new_session()
+
+        # *先创建所有徽章，再一次性加入场景和物理引擎
+        badges = []
+        for role, size, image, x, y, angle, rotate in zip(
+            snapshot.role.tolist(), snapshot.size.tolist(), snapshot.image.tolist(),
+            snapshot.x.tolist(), snapshot.y.tolist(), snapshot.angle.tolist(), snapshot.rotate.tolist()
+        ):
+            badge = (OtherBadge if role == ROLE_OTHER else BadgeSprite)(size=size, img_path=snapshot.images[image])
+            badge.center_x = x
+            badge.center_y = y
+            badge.visual_badge.angle = angle
+            # *已落地的玩家徽章不再旋转，加入EntityStore时按它设置FLAG_ROTATE
+            badge.rotate = bool(rotate)
+            if role == ROLE_CURRENT_PLAYER:
+                self.player = badge
+            badges.append(badge)
+
+        self.sprites_to_add.extend(badges)
+        self.process_sprites()
 
-        self.player = BadgeSprite(
-            size=status["player"]["size"],
-            img_path=status["player"]["img_path"]
-        )
-        self.player.center_x = status["player"]["center_x"]
-        self.player.center_y = status["player"]["center_y"]
-        self.player.visual_badge.angle = status["player"]["angle"]
-        self.sprites_to_add.append(self.player)
+        for badge, vx, vy in zip(badges, snapshot.vx.tolist(), snapshot.vy.tolist()):
+            self.physics_engine.get_physics_object(badge).body.velocity = (vx, vy)
+        rows = [self.entities.row(badge) for badge in badges]
+        self.entities.vel[rows] = np.column_stack([snapshot.vx, snapshot.vy])
 
+        if self.player is None:
+            self.generate_player()
 
-        for other in status["others"]:
-            tmp = OtherBadge(
-            size=other["size"],
-            img_path=other["img_path"]
-            )
-            tmp.center_x = other["center_x"]
-            tmp.center_y = other["center_y"]
-            self.sprites_to_add.append(tmp)
-            self.process_sprites()
-            self.physics_engine.set_velocity(tmp, other["velocity"])
+    def setup(self):
+        self.setup_world()
+
+
+class Game(GameLogic, arcade.Window):
+    def __init__(self, queue1, queue2, telemetry_name=None):
+        arcade.Window.__init__(self, WINDOW_WIDTH, WINDOW_HEIGHT, WINDOW_TITLE, update_rate=1/FPS)
+        GameLogic.__init__(self)
         
-        self.physics_engine.set_velocity(self.player, status["player"]["velocity"])
+        file_path = os.path.dirname(os.path.abspath(__file__))
+        os.chdir(file_path)
+
+        self.visual_bagde = None
+
+        self.camera = None
+        self.gui_camera = None
+
+        # *所有徽章的显示sprite，整体一次绘制
+        self.visual_list = None
+
+        # *界面文字，只有内容变化时才重新排版
+        self.hud = None
+
+        # *平台预先画到离屏纹理中，每帧只画一次纹理
+        self.static_layer = StaticLayer(self.draw_static, self.static_bounds)
+
+        self.send_queue = queue1
+        self.receive_queue = queue2
+        self.server = Server(queue2, queue1, {
+            "pause": self.pause,
+            "resume": self.resume,
+            "exit": arcade.close_window,
+            "save": self.save,
+            "show_save": self.show_save,
+            "save_stats": self.save_writer.stats,
+            "load": self.load,
+            "profile": self.profile,
+            "leaderboard": self.leaderboard_page,
+        })
+        arcade.set_background_color(BACKGROUND_COLOR)
+
+        # *每帧把运行数据发布到共享内存，辅助进程直接读取
+        self.telemetry = TelemetryWriter(telemetry_name) if telemetry_name else None
+        self.recorder = ScoreRecorder(GUEST_USER_ID)
+
+        # *排行榜前几名缓存在内存中，每写入一批分数就更新
+        self.leaderboard = Leaderboard()
+        try:
+            self.leaderboard.setup()
+        except Exception as e:
+            print(f"Error: {e}")
+        self.recorder.add_listener(self.leaderboard.add)
+        self.frames = 0
+        self.physics_ms = 0.0
+        self.draw_ms = 0.0
+        self.fps = 0.0
+
+
+    def setup(self):
+        # *设置相机
+        self.camera = arcade.Camera(WINDOW_WIDTH, WINDOW_HEIGHT)
+        self.gui_camera = arcade.Camera(WINDOW_WIDTH, WINDOW_HEIGHT)
+
+        # *预热徽章纹理缓存
+        texture_cache.warm()
+
+        self.visual_list = arcade.SpriteList()
+
+        self.setup_world()
+        self.static_layer.invalidate()
+
+        # 创建暂停按钮
+        self.pause_button = arcade.SpriteSolidColor(100, 50, arcade.color.GRAY)
+        self.pause_button.center_x = WINDOW_WIDTH - 60
+        self.pause_button.center_y = WINDOW_HEIGHT - 30
+        self.scene.add_sprite("GUI", self.pause_button)
+
+        self.hud = Hud()
+        self.hud.add("score", "Score: {}".format, 10, 10)
+        self.hud.add(
+            "pause", lambda paused: "Resume" if paused else "Pause",
+            self.pause_button.center_x - 40, self.pause_button.center_y - 10, arcade.color.WHITE, 25
+        )
+
+    def on_draw(self):
+        start = time.perf_counter()
+        profiler = self.profiler
+        self.clear()
+        self.camera.use()
+        with profiler.section("draw_platform"):
+            self.static_layer.draw()
+
+        with profiler.section("draw_sync"):
+            self.sync_visuals()
+        with profiler.section("draw_badges"):
+            self.visual_list.draw()
+        with profiler.section("draw_particles"):
+            self.particle_system.draw()
+
+        self.gui_camera.use()
+        # self.scene.draw(["Score", ])
+        with profiler.section("draw_hud"):
+            self.hud.update("score", self.score)
+            self.hud.update("pause", self.paused)
+            self.hud.draw()
+        self.draw_ms = (time.perf_counter() - start) * 1000
+
+    def draw_static(self):
+        """ 绘制不会变化的内容，只在生成背景层时调用 """
+        self.scene.draw([
+            "Platform",
+        ])
+
+    def static_bounds(self):
+        """ 窗口内可见的平台所占的范围，两侧的墙在窗口外，不计入 """
+        width, height = self.get_size()
+        visible = [
+            sprite for sprite in self.scene['Platform']
+            if sprite.right > 0 and sprite.left < width and sprite.top > 0 and sprite.bottom < height
+        ]
+        if not visible:
+            return 0, 0, 0, 0
+        return (
+            min(sprite.left for sprite in visible),
+            min(sprite.bottom for sprite in visible),
+            max(sprite.right for sprite in visible),
+            max(sprite.top for sprite in visible),
+        )
+
+    def on_update(self, delta_time: float):
+        """Movement and game logic"""
+        # *arcade每帧先调用on_update再调用on_draw，在这里结束上一帧的计时
+        self.profiler.end_frame()
+        with self.profiler.section("communicate"):
+            self.communicate()
+
+        if not self.paused:
+            start = time.perf_counter()
+            self.advance(delta_time)
+            self.physics_ms = (time.perf_counter() - start) * 1000
+
+        self.publish_telemetry(delta_time)
+
+    def publish_telemetry(self, delta_time: float):
+        self.frames += 1
+        if delta_time > 0:
+            self.fps = 1 / delta_time if not self.fps else self.fps * 0.9 + 0.1 / delta_time
+        if self.telemetry is None:
+            return
+
+        roles = self.entities.count_by("role", minlength=ROLE_CURRENT_PLAYER + 1)
+        self.telemetry.publish(
+            frame=self.frames,
+            score=self.score,
+            paused=self.paused,
+            players=int(roles[ROLE_PLAYER]),
+            others=int(roles[ROLE_OTHER]),
+            sleeping=self.entities.count_flag(FLAG_SLEEPING),
+            particles=self.particle_system.count,
+            physics_ms=self.physics_ms,
+            draw_ms=self.draw_ms,
+            fps=self.fps,
+        )
+
+    def badge_added(self, sprite):
+        self.visual_list.append(sprite.visual_badge)
+
+    def badge_removed(self, sprite):
+        sprite.visual_badge.remove_from_sprite_lists()
+
+    def sync_visuals(self):
+        """ 从EntityStore同步显示位置和角度，只处理移动过和正在旋转的徽章 """
+        store = self.entities
+        sprites = store.sprites
+
+        moved = store.take_moved()
+        xs, ys = store.pos[moved].T.tolist()
+        for row, x, y in zip(moved.tolist(), xs, ys):
+            sprites[row].visual_badge.position = (x, y)
+
+        rotating = np.flatnonzero(store.flags & FLAG_ROTATE)
+        store.angle[rotating] += ROTATION_SPEED
+        for row, angle in zip(rotating.tolist(), store.angle[rotating].tolist()):
+            sprites[row].visual_badge.angle = angle
+
+    def on_key_press(self, symbol: int, modifiers: int):
+        if symbol in (arcade.key.A, arcade.key.LEFT):
+            self.left_pressing = True
+        elif symbol in (arcade.key.D, arcade.key.RIGHT):
+            self.right_pressing = True
+        elif symbol in (arcade.key.S, arcade.key.DOWN):
+            self.down_pressing = True
+    
+    def on_key_release(self, symbol: int, modifiers: int):
+        if symbol in (arcade.key.A, arcade.key.LEFT):
+            self.left_pressing = False
+        elif symbol in (arcade.key.D, arcade.key.RIGHT):
+            self.right_pressing = False
+        elif symbol in (arcade.key.S, arcade.key.DOWN):
+            self.down_pressing = False
+
+    def on_mouse_press(self, x, y, *args):
+        if self.pause_button.collides_with_point((x, y)):
+            self.paused = not self.paused
+
+    def on_deactivate(self):
+        self.paused = True
+
+    def communicate(self):
+        """ 与其他进程通信，暂停时也照常处理请求 """
+        self.server.poll()
+
+    def pause(self):
+        self.paused = True
+
+    def resume(self):
+        self.paused = False
+
+    def leaderboard_page(self, page=1, user_id=None):
+        """ 排行榜的第page页，给出user_id时只看该用户的记录 """
+        return self.leaderboard.top(page, user_id=user_id)
+
     def draw_save(self):
         self.paused = True
         saves = self.show_save()
         if not saves:
             return
         for i, save in enumerate(saves):
-            arcade.draw_text(save, 10, 10 + i*20, arcade.color.BLACK, 20)
+            arcade.draw_text(save["filename"], 10, 10 + i*20, arcade.color.BLACK, 20)
     
 
-def run(queue1: Queue, queue2: Queue):
-    game = Game(queue1, queue2)
+def run(queue1: Queue, queue2: Queue, telemetry_name=None):
+    game = Game(queue1, queue2, telemetry_name)
     game.setup()
-    arcade.run()
+    try:
+        arcade.run()
+    finally:
+        # *窗口关闭(包括辅助端的exit命令)后写完剩余的存档和分数
+        game.recorder.close()
+        game.save_writer.close()
+        if game.telemetry is not None:
+            game.telemetry.close()
@@ -0,0 +1,82 @@
+import os
+import time
+import random
+import argparse
+
+from config import *
+from badge import texture_cache
+from effect import ParticleSystem
+from game import GameLogic
+
+
+class HeadlessGame(GameLogic):
+    """ 无窗口模拟：与游戏相同的物理、生成和合成规则，不创建窗口和相机，也不绘制 """
+    def __init__(self, seed=None):
+        super().__init__()
+        random.seed(seed)
+        self.particle_system = ParticleSystem(seed=seed)
+
+        # *计时器按tick计算：[回调, 间隔tick数, 下次触发的tick]
+        self.timers = []
+
+    def setup(self):
+        texture_cache.warm()
+        self.timers.clear()
+        self.setup_world()
+
+    def schedule(self, func, interval):
+        ticks = max(1, round(interval / PHYSICS_TICK))
+        self.timers.append([func, ticks, self.physics_ticks + ticks])
+
+    def unschedule(self, func):
+        self.timers = [timer for timer in self.timers if timer[0] != func]
+
+    def tick(self):
+        for timer in list(self.timers):
+            # *与pyglet相同：本tick中已被unschedule的计时器不再触发
+            if not any(timer is current for current in self.timers):
+                continue
+            func, ticks, due = timer
+            if self.physics_ticks >= due:
+                timer[2] = due + ticks
+                func(ticks * PHYSICS_TICK)
+        super().tick()
+
+    def step(self, n: int):
+        """ 连续推进n个tick，返回运行统计 """
+        start = time.perf_counter()
+        for _ in range(n):
+            self.tick()
+            self.profiler.end_frame()
+        seconds = time.perf_counter() - start
+
+        return {
+            "ticks": n,
+            "seconds": seconds,
+            "ticks_per_second": n / seconds if seconds else float("inf"),
+            "score": self.score,
+            "badges": len(self.entities),
+        }
+
+
+def run(ticks: int, seed=None):
+    file_path = os.path.dirname(os.path.abspath(__file__))
+    os.chdir(file_path)
+
+    game = HeadlessGame(seed)
+    game.setup()
+    return game.step(ticks)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="无窗口运行游戏模拟")
+    parser.add_argument("--ticks", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    stats = run(args.ticks, args.seed)
+    print(
+        f"{stats['ticks']} ticks in {stats['seconds']:.2f}s "
+        f"({stats['ticks_per_second']:.0f} ticks/s), "
+        f"score {stats['score']}, badges {stats['badges']}"
+    )
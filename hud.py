@@ -0,0 +1,35 @@
+import arcade
+
+
+class HudField:
+    """ 一个常驻的文本对象，只有显示的值变化时才重新排版 """
+
+    def __init__(self, format, x, y, color, font_size):
+        self.format = format
+        self.value = None
+        self.text = arcade.Text("", x, y, color, font_size)
+        self.layouts = 0
+
+    def update(self, value):
+        if value == self.value and self.layouts:
+            return
+        self.value = value
+        self.text.text = self.format(value)
+        self.layouts += 1
+
+
+class Hud:
+    """ 界面上的文字层，按名字添加字段，每帧传入最新的值后一起绘制 """
+
+    def __init__(self):
+        self.fields: dict[str, HudField] = {}
+
+    def add(self, name, format, x, y, color=arcade.color.BLACK, font_size=20):
+        self.fields[name] = HudField(format, x, y, color, font_size)
+
+    def update(self, name, value):
+        self.fields[name].update(value)
+
+    def draw(self):
+        for field in self.fields.values():
+            field.text.draw()
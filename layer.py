@@ -0,0 +1,98 @@
+import arcade
+
+from arcade.gl import geometry
+
+
+class StaticLayer:
+    """
+    把不变的内容(平台)预先画到离屏纹理中，之后每帧只画一个矩形。
+    纹理只覆盖内容所在的区域并裁剪到窗口内，背景色仍由clear填充。
+    窗口大小变化或调用invalidate后，下一次绘制时重新生成。
+    """
+
+    VERTEX_SHADER = """
+    #version 330
+
+    in vec2 in_vert;
+    in vec2 in_uv;
+    out vec2 v_uv;
+
+    void main() {
+        gl_Position = vec4(in_vert, 0.0, 1.0);
+        v_uv = in_uv;
+    }
+    """
+
+    FRAGMENT_SHADER = """
+    #version 330
+
+    uniform sampler2D layer;
+
+    in vec2 v_uv;
+    out vec4 f_color;
+
+    void main() {
+        f_color = texture(layer, v_uv);
+    }
+    """
+
+    def __init__(self, draw, bounds):
+        """
+        :param draw: 绘制内容的函数，调用时投影已设置为内容所在的区域
+        :param bounds: 返回内容范围(left, bottom, right, top)的函数，窗口坐标
+        """
+        self.draw_content = draw
+        self.bounds = bounds
+
+        self.renders = 0
+        self._size = None
+        self._texture = None
+        self._framebuffer = None
+        self._program = None
+        self._quad = None
+
+    def invalidate(self):
+        self._size = None
+
+    def draw(self):
+        window = arcade.get_window()
+        size = window.get_size()
+        if size != self._size:
+            self._render(window.ctx, size)
+
+        if self._quad is not None:
+            self._texture.use(0)
+            self._quad.render(self._program)
+
+    def _render(self, ctx, size):
+        if self._program is None:
+            self._program = ctx.program(vertex_shader=self.VERTEX_SHADER, fragment_shader=self.FRAGMENT_SHADER)
+            self._program["layer"] = 0
+
+        self._size = size
+        self.renders += 1
+
+        width, height = size
+        left, bottom, right, top = self.bounds()
+        left, bottom = max(0, int(left)), max(0, int(bottom))
+        right, top = min(width, int(right + 0.5)), min(height, int(top + 0.5))
+        if right <= left or top <= bottom:
+            self._quad = None
+            return
+
+        # *纹理与屏幕像素一一对应，不需要插值
+        region = (right - left, top - bottom)
+        self._texture = ctx.texture(region, components=4, filter=(ctx.NEAREST, ctx.NEAREST))
+        self._framebuffer = ctx.framebuffer(color_attachments=[self._texture])
+
+        projection = ctx.projection_2d
+        with self._framebuffer.activate():
+            self._framebuffer.clear()
+            ctx.projection_2d = (left, right, bottom, top)
+            self.draw_content()
+        ctx.projection_2d = projection
+
+        self._quad = geometry.quad_2d(
+            size=(2 * region[0] / width, 2 * region[1] / height),
+            pos=((left + right) / width - 1, (bottom + top) / height - 1),
+        )
@@ -0,0 +1,134 @@
+import bisect
+import threading
+
+from config import LEADERBOARD_SIZE, LEADERBOARD_PAGE_SIZE
+from recorder import RECORD_FIELDS
+from utils import UtilDatabase, UtilRecord, db
+
+
+# 排行榜用到的索引：按用户查分数时用(user_id, value)，它同时覆盖只按user_id的查询；全局排名按分数倒序扫描
+INDEXES = {
+    "record_user_value": "record (user_id, value DESC)",
+    "record_value": "record (value DESC)",
+}
+
+USER_FIELDS = {"id": "INTEGER PRIMARY KEY", "name": "TEXT", "password": "TEXT"}
+
+# 分数相同时先达成的排在前面，与record表中索引的顺序(rowid)一致
+TOP_QUERY = (
+    "SELECT r.rowid, r.user_id, u.name, r.value, r.record_time FROM record r "
+    "LEFT JOIN user u ON u.id = r.user_id "
+    "{where}ORDER BY r.value DESC, r.rowid LIMIT ? OFFSET ?"
+)
+
+GUEST_NAME = "游客"
+
+
+class Leaderboard:
+    """
+    分数排行榜：全局和单个用户的前N名，带分页，用户名通过连接查询一次取出。
+    全局前capacity名另外保存在内存中，ScoreRecorder每写入一批分数就更新一次，
+    落在缓存范围内的查询不访问数据库。
+    """
+
+    def __init__(self, capacity=LEADERBOARD_SIZE, manager=None):
+        self.capacity = capacity
+        self.manager = manager or db
+
+        # *按(-分数, rowid)排序的前capacity条记录，以及用户名缓存
+        self._keys = []
+        self._entries = []
+        self._names = {}
+        self._loaded = False
+        self._lock = threading.Lock()
+
+        self.metrics = {"cache_hits": 0, "queries": 0}
+
+    def setup(self):
+        """ 建表、建索引并载入缓存，需在分数开始写入之前调用 """
+        conn, cursor = self.manager.connection(), self.manager.cursor()
+        UtilDatabase.safe_create_table(conn, cursor, "user", USER_FIELDS)
+        UtilDatabase.safe_create_table(conn, cursor, "record", RECORD_FIELDS)
+        with self.manager.transaction() as cursor:
+            for name, target in INDEXES.items():
+                cursor.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {target}")
+            rows = cursor.execute(TOP_QUERY.format(where=""), (self.capacity, 0)).fetchall()
+
+        with self._lock:
+            self._keys.clear()
+            self._entries.clear()
+            for rowid, user_id, name, value, record_time in rows:
+                self._insert(rowid, user_id, value, record_time)
+                self._names[user_id] = name
+            self._loaded = True
+
+    def add(self, rows):
+        """
+        ScoreRecorder的监听函数，在后台线程中调用，rows为(rowid, user_id, value, record_time)列表。
+        同一局的分数只增不减，已在缓存中的行更新后仍在前capacity名内，所以缓存始终与数据库一致。
+        """
+        with self._lock:
+            if not self._loaded:
+                return
+            for rowid, user_id, value, record_time in rows:
+                self._discard(rowid)
+                if len(self._keys) == self.capacity and (-value, rowid) >= self._keys[-1]:
+                    continue
+                self._insert(rowid, user_id, value, record_time)
+            missing = {entry["user_id"] for entry in self._entries} - self._names.keys()
+
+        if missing:
+            names = UtilRecord.get_owners(missing, self.manager.cursor())
+            with self._lock:
+                for user_id in missing:
+                    self._names[user_id] = names.get(user_id)
+
+    def top(self, page=1, page_size=LEADERBOARD_PAGE_SIZE, user_id=None) -> list[dict]:
+        """ 第page页(从1开始)的排名，user_id为None时为全局排行 """
+        page, page_size = max(1, int(page)), max(1, int(page_size))
+        offset = (page - 1) * page_size
+
+        if user_id is None:
+            with self._lock:
+                if self._loaded and offset + page_size <= self.capacity:
+                    self.metrics["cache_hits"] += 1
+                    return [
+                        {"rank": offset + i + 1, "user_id": entry["user_id"], "name": self._name(entry["user_id"]),
+                         "value": entry["value"], "record_time": entry["record_time"]}
+                        for i, entry in enumerate(self._entries[offset:offset + page_size])
+                    ]
+
+        self.metrics["queries"] += 1
+        if user_id is None:
+            command, params = TOP_QUERY.format(where=""), (page_size, offset)
+        else:
+            command, params = TOP_QUERY.format(where="WHERE r.user_id = ? "), (int(user_id), page_size, offset)
+        rows = self.manager.cursor().execute(command, params).fetchall()
+        return [
+            {"rank": offset + i + 1, "user_id": user_id, "name": name or GUEST_NAME,
+             "value": value, "record_time": record_time}
+            for i, (_, user_id, name, value, record_time) in enumerate(rows)
+        ]
+
+    def stats(self):
+        with self._lock:
+            return dict(self.metrics, cached=len(self._entries))
+
+    def _discard(self, rowid):
+        for index, (_, cached) in enumerate(self._keys):
+            if cached == rowid:
+                del self._keys[index]
+                del self._entries[index]
+                return
+
+    def _insert(self, rowid, user_id, value, record_time):
+        key = (-value, rowid)
+        index = bisect.bisect(self._keys, key)
+        self._keys.insert(index, key)
+        self._entries.insert(index, {"user_id": user_id, "value": value, "record_time": record_time})
+        if len(self._keys) > self.capacity:
+            self._keys.pop()
+            self._entries.pop()
+
+    def _name(self, user_id):
+        return self._names.get(user_id) or GUEST_NAME
@@ -0,0 +1,161 @@
+import math
+
+import arcade
+import pymunk
+
+
+def collision_type(role, img_path, size):
+    """ 由(徽章图片, 大小)生成碰撞类型，只有能合成的同类徽章之间才注册回调 """
+    return f"{role}:{img_path}:{size}"
+
+
+class BadgePhysicsEngine(arcade.PymunkPhysicsEngine):
+    """ 在arcade的pymunk物理引擎上维护 shape -> sprite 的索引，范围检索由EntityStore.query_radius负责 """
+
+    def __init__(self, gravity=(0, 0), damping: float = 1.0, maximum_incline_on_ground: float = 0.708,
+                 sleep_time=float("inf"), idle_speed=0.0):
+        super().__init__(gravity=gravity, damping=damping, maximum_incline_on_ground=maximum_incline_on_ground)
+        self.shape_sprites = {}
+        # *设置后每步把未休眠刚体的位置和速度批量写入EntityStore
+        self.entities = None
+
+        # *静止超过sleep_time秒(速度低于idle_speed)的物体休眠，不再参与求解，被碰到或施加冲量时自动唤醒
+        self.space.sleep_time_threshold = sleep_time
+        self.space.idle_speed_threshold = idle_speed
+
+    def add_sprite(self, sprite, *args, radius=None, **kwargs):
+        """ 给出radius时使用圆形碰撞形状代替由hit box生成的多边形 """
+        if radius is not None:
+            kwargs.setdefault("moment_of_inertia", pymunk.moment_for_circle(kwargs.get("mass", 1), 0, radius))
+        super().add_sprite(sprite, *args, **kwargs)
+
+        physics_object = self.sprites[sprite]
+        if physics_object.body.body_type == pymunk.Body.DYNAMIC:
+            physics_object.body.velocity_func = self._velocity_func(
+                sprite, kwargs.get("max_horizontal_velocity"), kwargs.get("max_vertical_velocity")
+            )
+        if radius is not None:
+            poly = physics_object.shape
+            circle = pymunk.Circle(physics_object.body, radius)
+            circle.collision_type = poly.collision_type
+            circle.friction = poly.friction
+            circle.elasticity = poly.elasticity
+            self.space.remove(poly)
+            self.space.add(circle)
+            physics_object.shape = circle
+        self.shape_sprites[physics_object.shape] = sprite
+
+    @staticmethod
+    def _velocity_func(sprite, max_horizontal_velocity, max_vertical_velocity):
+        """
+        与arcade的限速规则相同(包括超过竖直限速时取水平限速的行为)，但不直接给velocity赋值：
+        赋值会唤醒刚体并清零静止计时，落地的徽章每步都会被重力加速后限速，因而永远无法休眠。
+        这里先算出限速后的目标速度，再折算成等效重力交给pymunk积分。每个刚体每步都会调用，只用浮点数计算。
+        """
+        data = sprite.pymunk
+        max_velocity = data.max_velocity
+        update_velocity = pymunk.Body.update_velocity
+
+        def velocity_func(body, gravity, damping, dt):
+            if data.damping is not None:
+                damping = data.damping ** dt
+            if data.gravity is not None:
+                gravity = data.gravity
+            gx, gy = gravity
+            vx, vy = body.velocity
+            fx, fy = body.force
+            mass = body.mass
+
+            px = vx * damping + (gx + fx / mass) * dt
+            py = vy * damping + (gy + fy / mass) * dt
+            tx, ty = px, py
+            if max_velocity:
+                length = math.hypot(px, py)
+                if length > max_velocity:
+                    tx, ty = px * max_velocity / length, py * max_velocity / length
+            if max_horizontal_velocity and abs(tx) > max_horizontal_velocity:
+                tx = math.copysign(max_horizontal_velocity, tx)
+            if max_vertical_velocity and abs(ty) > max_vertical_velocity:
+                ty = math.copysign(max_horizontal_velocity, ty)
+
+            update_velocity(body, (gx + (tx - px) / dt, gy + (ty - py) / dt), damping, dt)
+
+        return velocity_func
+
+    def remove_sprite(self, sprite):
+        self.shape_sprites.pop(self.sprites[sprite].shape, None)
+        super().remove_sprite(sprite)
+
+    def resync_sprites(self):
+        """ 与arcade相同，把刚体的位置和角度同步到sprite，同时收集数据批量写入EntityStore """
+        store = self.entities
+        rows, positions, velocities = [], [], []
+
+        for sprite in self.non_static_sprite_list.copy():
+            body = self.sprites[sprite].body
+            if body.is_sleeping:
+                continue
+
+            original_position = sprite.position
+            new_position = body.position
+            new_angle = math.degrees(body.angle)
+
+            dx = new_position[0] - original_position[0]
+            dy = new_position[1] - original_position[1]
+            d_angle = new_angle - sprite.angle
+
+            sprite.position = new_position
+            sprite.angle = new_angle
+            sprite.pymunk_moved(self, dx, dy, d_angle)
+
+            if store is not None:
+                row = store.rows.get(sprite)
+                if row is not None:
+                    rows.append(row)
+                    positions.append(new_position)
+                    velocities.append(body.velocity)
+
+        if store is not None:
+            store.update_rows(rows, positions, velocities)
+
+    def get_sprite_for_shape(self, shape):
+        """ 原实现会遍历所有sprite，这里直接查索引 """
+        return self.shape_sprites.get(shape)
+
+    def add_begin_handler(self, first_type, second_type, handler):
+        """ 只在两个形状开始接触时调用一次handler，碰撞本身照常处理 """
+        def begin(sprite_a, sprite_b, *args):
+            if sprite_a is not None and sprite_b is not None:
+                handler(sprite_a, sprite_b, *args)
+            return True
+
+        self.add_collision_handler(first_type, second_type, begin_handler=begin)
+
+    def add_wildcard_begin_handler(self, collision_type, handler):
+        """
+        collision_type与任何形状开始接触时调用一次handler(sprite, other)，other为静态形状时是None。
+        !与collision_type单独注册了回调的类型接触时，pymunk只调用那一对的回调，不会再调用这里的handler。
+        """
+        if collision_type not in self.collision_types:
+            self.collision_types.append(collision_type)
+
+        def begin(arbiter, space, data):
+            sprite_a, sprite_b = self.get_sprites_from_arbiter(arbiter)
+            if sprite_a is not None:
+                handler(sprite_a, sprite_b, arbiter, space, data)
+            return True
+
+        self.space.add_wildcard_collision_handler(self.collision_types.index(collision_type)).begin = begin
+
+    def add_static_box(self, left, bottom, right, top, collision_type=None, friction=0.2, elasticity=None):
+        """ 在静态刚体上直接添加一个矩形碰撞形状，不对应任何sprite """
+        shape = pymunk.Poly.create_box_bb(self.space.static_body, pymunk.BB(left, bottom, right, top))
+        if collision_type:
+            if collision_type not in self.collision_types:
+                self.collision_types.append(collision_type)
+            shape.collision_type = self.collision_types.index(collision_type)
+        if elasticity is not None:
+            shape.elasticity = elasticity
+        shape.friction = friction
+        self.space.add(shape)
+        return shape
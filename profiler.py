@@ -0,0 +1,99 @@
+import time
+
+import numpy as np
+
+
+class Section:
+    """ 一个计时区段，可重复进入，同一帧内多次进入时累加 """
+    __slots__ = ("profiler", "index", "start")
+
+    def __init__(self, profiler, index):
+        self.profiler = profiler
+        self.index = index
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        self.profiler.row[self.index] += (time.perf_counter() - self.start) * 1000
+
+
+class NullSection:
+    """ 关闭性能分析时使用，不做任何事 """
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+
+NULL_SECTION = NullSection()
+
+
+class FrameProfiler:
+    """
+    逐帧记录各区段耗时(毫秒)，保存在预分配的环形缓冲区中，只保留最近capacity帧。
+    每一帧是缓冲区中的一行，每个区段是一列，运行时不分配内存。
+    """
+
+    def __init__(self, sections, capacity=600, enabled=True):
+        self.names = list(sections)
+        self.capacity = capacity
+        self.enabled = enabled
+
+        self.samples = np.zeros((capacity, len(self.names)), dtype=np.float64)
+        self.frame_numbers = np.zeros(capacity, dtype=np.int64)
+        self.frames = 0
+        self.row = self.samples[0]
+
+        self._sections = {name: Section(self, i) for i, name in enumerate(self.names)}
+
+    def section(self, name):
+        """ 用with包住需要计时的代码 """
+        return self._sections[name] if self.enabled else NULL_SECTION
+
+    def end_frame(self):
+        """ 结束当前帧，移动到环形缓冲区的下一行 """
+        if not self.enabled:
+            return
+        self.frame_numbers[self.frames % self.capacity] = self.frames
+        self.frames += 1
+        self.row = self.samples[self.frames % self.capacity]
+        self.row[:] = 0
+
+    def recorded(self):
+        """ 按时间顺序返回已完成帧的帧号和耗时 """
+        # *frames % capacity这一行是正在累加的当前帧，不算在内，所以最多返回capacity - 1帧
+        n = min(self.frames, self.capacity - 1)
+        order = np.arange(self.frames - n, self.frames) % self.capacity
+        return self.frame_numbers[order], self.samples[order]
+
+    def report(self) -> dict:
+        """ 每个区段的p50/p95/p99和最大值 """
+        _, samples = self.recorded()
+        if not len(samples):
+            return {}
+
+        p50, p95, p99 = np.percentile(samples, [50, 95, 99], axis=0)
+        peak = samples.max(axis=0)
+        return {
+            name: {"p50": float(p50[i]), "p95": float(p95[i]), "p99": float(p99[i]), "max": float(peak[i])}
+            for i, name in enumerate(self.names)
+        }
+
+    def dump(self, path):
+        """ 把记录的逐帧耗时写成csv，返回写入的帧数 """
+        frames, samples = self.recorded()
+        table = np.column_stack([frames, samples])
+        np.savetxt(path, table, delimiter=",", fmt=["%d"] + ["%.4f"] * len(self.names),
+                   header="frame," + ",".join(self.names), comments="")
+        return len(frames)
+
+    def reset(self):
+        self.samples[:] = 0
+        self.frames = 0
+        self.row = self.samples[0]
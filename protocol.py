@@ -0,0 +1,137 @@
+import time
+import queue
+import itertools
+from collections import deque
+
+from dataclasses import dataclass, field
+from typing import Any, Callable
+
+
+@dataclass()
+class Request:
+    """ 辅助进程发给游戏进程的请求，id用于匹配回复 """
+    id: int
+    command: str
+    args: dict = field(default_factory=dict)
+
+
+@dataclass()
+class Response:
+    """ 游戏进程的回复，ok为False时error说明原因 """
+    id: int
+    ok: bool = True
+    result: Any = None
+    error: str | None = None
+
+
+def drain(receive_queue) -> list:
+    """ 非阻塞地取出队列中所有批次，展开成一个列表 """
+    messages = []
+    while True:
+        try:
+            messages.extend(receive_queue.get_nowait())
+        except queue.Empty:
+            return messages
+
+
+class Server:
+    """ 游戏端：每帧处理一次收到的请求，所有回复合成一批发回 """
+
+    def __init__(self, receive_queue, send_queue, handlers: dict[str, Callable]):
+        self.receive_queue = receive_queue
+        self.send_queue = send_queue
+        self.handlers = handlers
+
+    def poll(self):
+        replies = []
+        for request in drain(self.receive_queue):
+            handler = self.handlers.get(request.command)
+            if handler is None:
+                replies.append(Response(request.id, ok=False, error=f"unknown command {request.command}"))
+                continue
+            try:
+                replies.append(Response(request.id, result=handler(**request.args)))
+            except Exception as e:
+                replies.append(Response(request.id, ok=False, error=str(e)))
+
+        if replies:
+            self.send_queue.put(replies)
+
+
+class Client:
+    """
+    辅助端：请求先放入发件箱，flush时一批发出；poll非阻塞地收取回复、
+    调用回调并处理超时，不会因为游戏繁忙而卡住界面
+    """
+
+    def __init__(self, send_queue, receive_queue, timeout: float = 3.0, samples: int = 1000):
+        self.send_queue = send_queue
+        self.receive_queue = receive_queue
+        self.timeout = timeout
+
+        self._ids = itertools.count(1)
+        self._outbox: list[Request] = []
+        # *等待回复的请求 {id: (回调, 发送时间, 超时时间)}
+        self._pending: dict[int, tuple[Callable | None, float, float]] = {}
+
+        # *只保留最近samples次请求的延迟(毫秒)，与FrameProfiler的环形缓冲区一样不随运行时间增长
+        self.latencies: deque[float] = deque(maxlen=samples)
+        self.requests = 0
+        self.timeouts = 0
+        self.late = 0
+
+    def request(self, command: str, callback: Callable[[Response], None] | None = None,
+                timeout: float | None = None, **args) -> int:
+        request = Request(next(self._ids), command, args)
+        self._outbox.append(request)
+        self._pending[request.id] = (callback, 0.0, self.timeout if timeout is None else timeout)
+        return request.id
+
+    def flush(self):
+        """ 把发件箱中的请求作为一批发出 """
+        if not self._outbox:
+            return
+        now = time.perf_counter()
+        for request in self._outbox:
+            callback, _, timeout = self._pending[request.id]
+            self._pending[request.id] = (callback, now, timeout)
+        self.send_queue.put(self._outbox)
+        self._outbox = []
+
+    def poll(self):
+        self.flush()
+        now = time.perf_counter()
+
+        for response in drain(self.receive_queue):
+            pending = self._pending.pop(response.id, None)
+            if pending is None:
+                # *已经超时的请求，回复直接丢弃
+                self.late += 1
+                continue
+            callback, sent, _ = pending
+            self.latencies.append((now - sent) * 1000)
+            self.requests += 1
+            if callback is not None:
+                callback(response)
+
+        for id, (callback, sent, timeout) in list(self._pending.items()):
+            if sent and now - sent > timeout:
+                del self._pending[id]
+                self.timeouts += 1
+                if callback is not None:
+                    callback(Response(id, ok=False, error="timeout"))
+
+    def stats(self) -> dict:
+        latencies = sorted(self.latencies)
+        percentile = lambda p: latencies[min(len(latencies) - 1, int(p * len(latencies)))] if latencies else 0.0
+        return {
+            "requests": self.requests,
+            "samples": len(latencies),
+            "pending": len(self._pending),
+            "timeouts": self.timeouts,
+            "late": self.late,
+            "mean_ms": sum(latencies) / len(latencies) if latencies else 0.0,
+            "p50_ms": percentile(0.50),
+            "p95_ms": percentile(0.95),
+            "max_ms": latencies[-1] if latencies else 0.0,
+        }
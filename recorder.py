@@ -0,0 +1,166 @@
+import time
+import datetime
+import threading
+
+from collections import deque
+from config import RECORD_BATCH_SIZE, RECORD_FLUSH_INTERVAL
+from utils import UtilDatabase, db
+
+
+RECORD_FIELDS = {"user_id": "INTEGER", "value": "INTEGER", "record_time": "TEXT"}
+
+INSERT_RECORD = "INSERT INTO record (user_id, value, record_time) VALUES (?, ?, ?)"
+UPDATE_RECORD = "UPDATE record SET value = ?, record_time = ? WHERE rowid = ?"
+
+
+class ScoreRecorder:
+    """
+    后台分数记录线程：游戏循环只把(局, 用户, 分数, 时间)追加到deque中，不加锁也不碰数据库。
+    每一局在record表中只占一行：第一次写入时插入，之后更新同一行的分数。
+    后台线程攒够batch_size条或每隔flush_interval秒，把每一局最新的分数在一个事务中写入。
+    """
+
+    def __init__(self, user_id, batch_size=RECORD_BATCH_SIZE, flush_interval=RECORD_FLUSH_INTERVAL, manager=None):
+        self.user_id = user_id
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.manager = manager or db
+
+        # *deque的append和popleft是原子操作，游戏线程和后台线程之间不需要锁
+        self._events = deque()
+        self._wake = threading.Event()
+        self._running = True
+        self._thread = None
+
+        # *当前局的编号，以及每一局在record表中的rowid(只由后台线程使用)
+        self.session = 0
+        self._rowids = {}
+
+        # *写入进度，只有后台线程和等待flush的线程使用
+        self._cond = threading.Condition()
+        self._listeners = []
+
+        self.metrics = {
+            "submitted": 0,
+            "written": 0,
+            "failed": 0,
+            "inserted": 0,
+            "updated": 0,
+            "batches": 0,
+            "last_batch_rows": 0,
+            "last_batch_ms": 0.0,
+            "max_batch_ms": 0.0,
+        }
+
+    def record(self, value):
+        """ 在游戏循环中调用，value为当前局的总分，立即返回 """
+        if not self._running:
+            return
+        self._events.append((self.session, self.user_id, value, time.time()))
+        self.metrics["submitted"] += 1
+
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="ScoreRecorder", daemon=True)
+            self._thread.start()
+        if len(self._events) == self.batch_size:
+            self._wake.set()
+
+    def new_session(self):
+        """ 开始新的一局(例如读档后)，之后的分数写入新的一行 """
+        self.session += 1
+
+    def add_listener(self, listener):
+        """ 每批写入成功后在后台线程中调用listener(rows)，rows为(rowid, user_id, value, record_time)列表 """
+        self._listeners.append(listener)
+
+    def flush(self):
+        """ 等待已提交的分数全部写入(或写入失败) """
+        if self._thread is None:
+            return
+        target = self.metrics["submitted"]
+        self._wake.set()
+        with self._cond:
+            self._cond.wait_for(lambda: self.metrics["written"] + self.metrics["failed"] >= target
+                                or not self._thread.is_alive())
+
+    def close(self):
+        """ 写入剩余的分数并结束后台线程 """
+        self._running = False
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def stats(self):
+        with self._cond:
+            return dict(self.metrics, pending=len(self._events))
+
+    def _run(self):
+        UtilDatabase.safe_action(UtilDatabase.create_table, self.manager.connection(), self.manager.cursor(),
+                                 "record", RECORD_FIELDS)
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            # *先读_running，再取走队列：关闭前追加的分数一定会被这一轮写入
+            running = self._running
+            self._write_pending()
+            if not running:
+                break
+        self.manager.close()
+
+    def _write_pending(self):
+        # *同一局只保留最新的分数
+        latest = {}
+        events = 0
+        while self._events:
+            session, user_id, value, timestamp = self._events.popleft()
+            latest[session] = (user_id, value, timestamp)
+            events += 1
+        if not events:
+            return
+
+        start = time.perf_counter()
+        rows = []
+        inserted = 0
+        try:
+            with self.manager.transaction() as cursor:
+                updates = []
+                for session, (user_id, value, timestamp) in latest.items():
+                    record_time = datetime.datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d-%H:%M")
+                    rowid = self._rowids.get(session)
+                    if rowid is None:
+                        cursor.execute(INSERT_RECORD, (user_id, value, record_time))
+                        rowid = cursor.lastrowid
+                        inserted += 1
+                    else:
+                        updates.append((value, record_time, rowid))
+                    rows.append((rowid, user_id, value, record_time))
+                cursor.executemany(UPDATE_RECORD, updates)
+            failed = False
+        except Exception as e:
+            print(f"Error: {e}")
+            failed = True
+        else:
+            for (rowid, *_), session in zip(rows, latest):
+                self._rowids[session] = rowid
+        ms = (time.perf_counter() - start) * 1000
+
+        # *先通知监听者再更新计数，flush返回时监听者已看到这一批
+        if not failed:
+            for listener in self._listeners:
+                try:
+                    listener(rows)
+                except Exception as e:
+                    print(f"Error: {e}")
+
+        with self._cond:
+            if failed:
+                self.metrics["failed"] += events
+            else:
+                self.metrics["written"] += events
+                self.metrics["inserted"] += inserted
+                self.metrics["updated"] += len(rows) - inserted
+                self.metrics["batches"] += 1
+                self.metrics["last_batch_rows"] = len(rows)
+                self.metrics["last_batch_ms"] = ms
+                self.metrics["max_batch_ms"] = max(self.metrics["max_batch_ms"], ms)
+            self._cond.notify_all()
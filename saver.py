@@ -0,0 +1,323 @@
+import os
+import json
+import time
+import struct
+import pickle
+import threading
+
+import numpy as np
+
+from dataclasses import dataclass
+from config import SAVE_DIR, SAVE_SLOTS, SAVE_EXT, SAVE_FLUSH_TIMEOUT
+
+
+SAVE_MAGIC = b"BSAV"
+SAVE_VERSION = 2
+
+# 存档索引，记录每个存档的时间、分数、徽章数、版本和大小
+MANIFEST_NAME = "manifest.json"
+
+# 文件头：魔数、版本、分数、是否暂停、徽章数量、图片表长度
+HEADER = struct.Struct("<4sHqBIH")
+
+# 徽章角色
+ROLE_OTHER = 0
+ROLE_PLAYER = 1
+ROLE_CURRENT_PLAYER = 2
+
+# 按列存放的徽章数据，顺序即文件中的顺序
+COLUMNS = (
+    ("role", np.uint8),
+    ("size", np.uint8),
+    ("image", np.uint16),
+    ("x", np.float32),
+    ("y", np.float32),
+    ("vx", np.float32),
+    ("vy", np.float32),
+    ("angle", np.float32),
+    ("rotate", np.uint8),
+)
+
+# 各列从哪个版本开始写入存档，没有列出的列从版本1开始
+COLUMN_VERSIONS = {"rotate": 2}
+
+
+@dataclass()
+class Snapshot:
+    """ 按列存放的游戏状态，每个徽章一行，图片路径存为images中的下标 """
+    score: int
+    paused: bool
+    images: list[str]
+    role: np.ndarray
+    size: np.ndarray
+    image: np.ndarray
+    x: np.ndarray
+    y: np.ndarray
+    vx: np.ndarray
+    vy: np.ndarray
+    angle: np.ndarray
+    rotate: np.ndarray
+
+    def __len__(self):
+        return len(self.role)
+
+    def to_bytes(self) -> bytes:
+        parts = [HEADER.pack(SAVE_MAGIC, SAVE_VERSION, self.score, self.paused, len(self), len(self.images))]
+        for path in self.images:
+            data = path.encode("utf-8")
+            parts.append(struct.pack("<H", len(data)) + data)
+        for name, dtype in COLUMNS:
+            parts.append(np.ascontiguousarray(getattr(self, name), dtype=dtype).tobytes())
+        return b"".join(parts)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "Snapshot":
+        magic, version, score, paused, count, image_count = HEADER.unpack_from(data)
+        if magic != SAVE_MAGIC:
+            raise ValueError("not a save file")
+        if version > SAVE_VERSION:
+            raise ValueError(f"unsupported save version {version}")
+
+        offset = HEADER.size
+        images = []
+        for _ in range(image_count):
+            (length,) = struct.unpack_from("<H", data, offset)
+            offset += 2
+            images.append(data[offset:offset + length].decode("utf-8"))
+            offset += length
+
+        columns = {}
+        for name, dtype in COLUMNS:
+            if version < COLUMN_VERSIONS.get(name, 1):
+                continue
+            columns[name] = np.frombuffer(data, dtype=dtype, count=count, offset=offset)
+            offset += count * np.dtype(dtype).itemsize
+
+        if "rotate" not in columns:
+            # *版本1没有记录旋转状态，只让当前玩家旋转
+            columns["rotate"] = (columns["role"] == ROLE_CURRENT_PLAYER).astype(np.uint8)
+
+        return cls(score=score, paused=bool(paused), images=images, **columns)
+
+    @classmethod
+    def from_legacy(cls, status: dict) -> "Snapshot":
+        """ 兼容旧的.pkl存档 """
+        rows = [(ROLE_OTHER, other, 0) for other in status["others"]]
+        if status.get("player"):
+            rows.insert(0, (ROLE_CURRENT_PLAYER, status["player"], status["player"]["angle"]))
+
+        images = sorted({badge["img_path"] for _, badge, _ in rows})
+        index = {path: i for i, path in enumerate(images)}
+        return cls(
+            score=status["score"],
+            paused=status["paused"],
+            images=images,
+            role=np.array([role for role, _, _ in rows], dtype=np.uint8),
+            size=np.array([badge["size"] for _, badge, _ in rows], dtype=np.uint8),
+            image=np.array([index[badge["img_path"]] for _, badge, _ in rows], dtype=np.uint16),
+            x=np.array([badge["center_x"] for _, badge, _ in rows], dtype=np.float32),
+            y=np.array([badge["center_y"] for _, badge, _ in rows], dtype=np.float32),
+            vx=np.array([badge["velocity"][0] for _, badge, _ in rows], dtype=np.float32),
+            vy=np.array([badge["velocity"][1] for _, badge, _ in rows], dtype=np.float32),
+            angle=np.array([angle for _, _, angle in rows], dtype=np.float32),
+            rotate=np.array([role == ROLE_CURRENT_PLAYER for role, _, _ in rows], dtype=np.uint8),
+        )
+
+
+def read_snapshot(path) -> Snapshot:
+    """ 读取存档，新格式和旧的.pkl存档都可以读取 """
+    if path.endswith(".pkl"):
+        with open(path, "rb") as f:
+            return Snapshot.from_legacy(pickle.load(f))
+    with open(path, "rb") as f:
+        return Snapshot.from_bytes(f.read())
+
+
+def is_save_file(filename) -> bool:
+    return filename.startswith("save") and filename.endswith((SAVE_EXT, ".pkl"))
+
+
+def read_save_info(path) -> dict:
+    """ 读取单个存档的索引信息，新格式只读文件头 """
+    if path.endswith(".pkl"):
+        with open(path, "rb") as f:
+            status = pickle.load(f)
+        score, badges, version = status["score"], len(status["others"]) + bool(status.get("player")), 0
+    else:
+        with open(path, "rb") as f:
+            _, version, score, _, badges, _ = HEADER.unpack(f.read(HEADER.size))
+
+    return {
+        "filename": os.path.basename(path),
+        "time": os.path.getmtime(path),
+        "score": score,
+        "badges": badges,
+        "version": version,
+        "bytes": os.path.getsize(path),
+    }
+
+
+class SaveWriter:
+    """ 后台存档线程：主线程只生成快照，序列化、写入和存档轮换都在后台完成 """
+
+    def __init__(self, directory=SAVE_DIR, slots=SAVE_SLOTS):
+        self.directory = directory
+        self.slots = slots
+
+        # *只保留一个待写入的快照，连续多次存档时只写最新的一次
+        self._pending = None
+        self._busy = False
+        self._running = True
+        self._cond = threading.Condition()
+        self._thread = None
+
+        # *存档索引 {文件名: 信息}，首次使用时读取
+        self._manifest = None
+        self._manifest_lock = threading.Lock()
+
+        self.metrics = {
+            "submitted": 0,
+            "written": 0,
+            "coalesced": 0,
+            "failed": 0,
+            "last_snapshot_ms": 0.0,
+            "last_write_ms": 0.0,
+            "last_latency_ms": 0.0,
+            "max_latency_ms": 0.0,
+        }
+
+    def submit(self, filename, snapshot: Snapshot, snapshot_ms=0.0):
+        """ 提交一个快照，立即返回；close之后后台线程已退出，改为在调用线程中直接写入 """
+        submitted = time.perf_counter()
+        with self._cond:
+            self.metrics["submitted"] += 1
+            self.metrics["last_snapshot_ms"] = snapshot_ms
+            closed = not self._running
+            if not closed:
+                if self._pending is not None:
+                    self.metrics["coalesced"] += 1
+                self._pending = (filename, snapshot, submitted)
+
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="SaveWriter", daemon=True)
+                    self._thread.start()
+                self._cond.notify_all()
+
+        if closed:
+            self._process(filename, snapshot, submitted)
+
+    def flush(self, timeout=SAVE_FLUSH_TIMEOUT) -> bool:
+        """ 等待所有已提交的存档写入完成，超时返回False """
+        with self._cond:
+            return self._cond.wait_for(lambda: self._pending is None and not self._busy, timeout)
+
+    def close(self, timeout=SAVE_FLUSH_TIMEOUT):
+        if not self.flush(timeout):
+            print("Error: save writer did not finish in time")
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def list_saves(self) -> list[dict]:
+        """ 从存档索引中列出所有存档，按时间排序，不扫描目录也不打开存档 """
+        with self._manifest_lock:
+            return [dict(entry) for _, entry in sorted(self._load_manifest().items())]
+
+    def stats(self):
+        with self._cond:
+            return dict(self.metrics)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending is not None or not self._running)
+                if self._pending is None:
+                    return
+                filename, snapshot, submitted = self._pending
+                self._pending = None
+                self._busy = True
+
+            self._process(filename, snapshot, submitted)
+
+    def _process(self, filename, snapshot: Snapshot, submitted):
+        """ 写入一个快照并更新统计 """
+        start = time.perf_counter()
+        try:
+            self._write(filename, snapshot)
+            failed = False
+        except Exception as e:
+            print(f"Error: {e}")
+            failed = True
+        end = time.perf_counter()
+
+        with self._cond:
+            self._busy = False
+            if failed:
+                self.metrics["failed"] += 1
+            else:
+                latency = (end - submitted) * 1000
+                self.metrics["written"] += 1
+                self.metrics["last_write_ms"] = (end - start) * 1000
+                self.metrics["last_latency_ms"] = latency
+                self.metrics["max_latency_ms"] = max(self.metrics["max_latency_ms"], latency)
+            self._cond.notify_all()
+
+    def _write(self, filename, snapshot: Snapshot):
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, filename)
+
+        # *先写临时文件再重命名，保证不会留下写了一半的存档
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(snapshot.to_bytes())
+        os.replace(tmp, path)
+
+        with self._manifest_lock:
+            manifest = self._load_manifest()
+            manifest[filename] = {
+                "filename": filename,
+                "time": time.time(),
+                "score": snapshot.score,
+                "badges": len(snapshot),
+                "version": SAVE_VERSION,
+                "bytes": os.path.getsize(path),
+            }
+            self._rotate(manifest)
+            self._write_manifest(manifest)
+
+    def _rotate(self, manifest):
+        """ 只保留最新的slots个存档，文件名带时间戳，按名字排序即按时间排序 """
+        for file in sorted(manifest)[:-self.slots]:
+            path = os.path.join(self.directory, file)
+            if os.path.exists(path):
+                os.remove(path)
+            del manifest[file]
+
+    def _load_manifest(self) -> dict:
+        """ 读取存档索引，索引不存在时扫描一次目录重建 """
+        if self._manifest is not None:
+            return self._manifest
+
+        path = os.path.join(self.directory, MANIFEST_NAME)
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self._manifest = {entry["filename"]: entry for entry in json.load(f)}
+            return self._manifest
+
+        self._manifest = {}
+        if os.path.exists(self.directory):
+            for file in os.listdir(self.directory):
+                if is_save_file(file):
+                    self._manifest[file] = read_save_info(os.path.join(self.directory, file))
+            self._write_manifest(self._manifest)
+        return self._manifest
+
+    def _write_manifest(self, manifest):
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, MANIFEST_NAME)
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump([manifest[file] for file in sorted(manifest)], f, ensure_ascii=False, indent=1)
+        os.replace(tmp, path)
@@ -1,33 +1,219 @@
+import os
+import time
+import hashlib
 import threading
+
+import numpy as np
 from pydub import AudioSegment
-from pydub.playback import play
+
+from config import SOUND_CACHE_DIR
+
+
+class NullSink:
+    """A sink that discards audio. Used when there is no audio device, e.g. for tests and benchmarks."""
+
+    def __init__(self, frame_rate: int, channels: int, realtime: bool = False):
+        self.frame_rate = frame_rate
+        self.channels = channels
+        self.realtime = realtime
+        self.frames_written = 0
+
+    def write(self, data: np.ndarray):
+        """Consume one chunk of mixed int16 frames."""
+        self.frames_written += len(data)
+        if self.realtime:
+            time.sleep(len(data) / self.frame_rate)
+
+    def close(self):
+        pass
+
+
+class PyAudioSink:
+    """A sink that streams to the default output device through pyaudio."""
+
+    def __init__(self, frame_rate: int, channels: int):
+        import pyaudio
+
+        self._pyaudio = pyaudio.PyAudio()
+        self._stream = self._pyaudio.open(
+            format=pyaudio.paInt16,
+            channels=channels,
+            rate=frame_rate,
+            output=True,
+        )
+
+    def write(self, data: np.ndarray):
+        # Blocks until the device has room, which paces the mixer thread.
+        self._stream.write(data.tobytes())
+
+    def close(self):
+        self._stream.stop_stream()
+        self._stream.close()
+        self._pyaudio.terminate()
+
+
+_sink_error_logged = False
+
+
+def default_sink(frame_rate: int, channels: int):
+    """Return a device sink if pyaudio is available, otherwise a real-time NullSink.
+    The reason for falling back is printed the first time only."""
+    global _sink_error_logged
+    try:
+        return PyAudioSink(frame_rate, channels)
+    except Exception as e:
+        if not _sink_error_logged:
+            _sink_error_logged = True
+            print(f"Error: {e}")
+        return NullSink(frame_rate, channels, realtime=True)
+
+
+class PCMCache:
+    """
+    On-disk cache of decoded PCM, so later launches skip the ffmpeg decode.
+
+    Entries are raw int16 files named after the source file, the hash of its
+    content and the mixer format, and are memory-mapped on load. A changed
+    asset hashes to a new entry, and entries of the same source and format with
+    an older hash are removed; other formats of the same source are kept.
+    """
+
+    DIGEST_LENGTH = 16
+
+    def __init__(self, directory: str, frame_rate: int, channels: int):
+        self.directory = directory
+        self.frame_rate = frame_rate
+        self.channels = channels
+        self.hits = 0
+        self.misses = 0
+
+    def path(self, filename) -> str:
+        with open(filename, "rb") as f:
+            digest = hashlib.sha256(f.read()).hexdigest()[:self.DIGEST_LENGTH]
+        return os.path.join(self.directory, f"{os.path.basename(filename)}.{digest}{self._suffix()}")
+
+    def _suffix(self) -> str:
+        return f".{self.frame_rate}x{self.channels}.pcm"
+
+    def load(self, filename, decode) -> np.ndarray:
+        """Return the cached samples for filename, calling decode() and storing the result on a miss."""
+        path = self.path(filename)
+        if os.path.exists(path):
+            self.hits += 1
+            if os.path.getsize(path) == 0:
+                return np.zeros((0, self.channels), dtype=np.int16)
+            return np.memmap(path, dtype=np.int16, mode="r").reshape(-1, self.channels)
+
+        self.misses += 1
+        samples = decode()
+
+        os.makedirs(self.directory, exist_ok=True)
+        tmp = path + ".tmp"
+        samples.tofile(tmp)
+        os.replace(tmp, path)
+        self._remove_stale(filename, path)
+        return samples
+
+    def _remove_stale(self, filename, path):
+        """Remove older entries with the same source name and mixer format but a different content hash."""
+        prefix = os.path.basename(filename) + "."
+        suffix = self._suffix()
+        for entry in os.listdir(self.directory):
+            if not (entry.startswith(prefix) and entry.endswith(suffix)):
+                continue
+            digest = entry[len(prefix):-len(suffix)]
+            entry_path = os.path.join(self.directory, entry)
+            if len(digest) == self.DIGEST_LENGTH and "." not in digest and entry_path != path:
+                os.remove(entry_path)
+
+
+class Voice:
+    """One playing instance of a sound."""
+
+    def __init__(self, name: str, samples: np.ndarray):
+        self.name = name
+        self.samples = samples
+        self.position = 0
+
 
 class SoundManager:
-    def __init__(self):
+    def __init__(self, sink=None, max_voices: int = 8, frame_rate: int = 44100, channels: int = 2, chunk: int = 1024,
+                 cache_dir: str = SOUND_CACHE_DIR):
+        self.frame_rate = frame_rate
+        self.channels = channels
+        self.chunk = chunk
+        self.max_voices = max_voices
+        self.cache = PCMCache(cache_dir, frame_rate, channels) if cache_dir else None
+
         self.sounds = {}
-        self.threads = {}
+        # Voices are kept in start order, so the oldest one is stolen first.
+        self.voices: list[Voice] = []
+
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._running = True
+
+        self.sink = sink if sink is not None else default_sink(frame_rate, channels)
+        self.thread = threading.Thread(target=self._mix_loop, name="SoundManager", daemon=True)
+        self.thread.start()
 
     def add_sound(self, filename, name: str):
-        """Add a sound to the sound manager."""
-        sound = AudioSegment.from_file(filename)
-        self.sounds[name] = sound
+        """Add a sound to the sound manager, using the decoded-PCM cache when enabled."""
+        decode = lambda: self._to_pcm(AudioSegment.from_file(filename))
+        self.sounds[name] = self.cache.load(filename, decode) if self.cache else decode()
 
-    def _play_sound(self, sound: AudioSegment):
-        """Internal method to play sound in a separate thread."""
-        play(sound)
+    def add_segment(self, sound: AudioSegment, name: str):
+        """Add an already decoded sound."""
+        self.sounds[name] = self._to_pcm(sound)
+
+    def _to_pcm(self, sound: AudioSegment) -> np.ndarray:
+        """Convert a sound once to the mixer's PCM format."""
+        sound = sound.set_frame_rate(self.frame_rate).set_channels(self.channels).set_sample_width(2)
+        return np.frombuffer(sound.raw_data, dtype=np.int16).reshape(-1, self.channels)
 
     def play_sound(self, name: str):
-        """Play a sound."""
-        self._play_sound(self.sounds[name])
-        return 
-    
-        if name in self.sounds:
-            sound = self.sounds[name]
-            thread = threading.Thread(target=self._play_sound, args=(sound,))
-            thread.start()
-            self.threads[name] = thread
+        """Play a sound without blocking. Steals the oldest voice when the voice limit is reached."""
+        if name not in self.sounds:
+            return
+
+        with self._lock:
+            if len(self.voices) >= self.max_voices:
+                self.voices.pop(0)
+            self.voices.append(Voice(name, self.sounds[name]))
+        self._wakeup.set()
+
+    def is_playing(self, name: str) -> bool:
+        """Check whether a sound is currently playing."""
+        with self._lock:
+            return any(voice.name == name for voice in self.voices)
 
     def stop_sound(self, name: str):
         """Stop a sound."""
-        # pydub and simpleaudio do not support stopping a sound directly
-        pass
+        with self._lock:
+            self.voices = [voice for voice in self.voices if voice.name != name]
+
+    def close(self):
+        """Stop the mixer thread and release the sink."""
+        self._running = False
+        self._wakeup.set()
+        self.thread.join()
+        self.sink.close()
+
+    def _mix(self) -> np.ndarray:
+        """Mix one chunk from all active voices."""
+        mix = np.zeros((self.chunk, self.channels), dtype=np.int32)
+        with self._lock:
+            for voice in self.voices:
+                part = voice.samples[voice.position:voice.position + self.chunk]
+                mix[:len(part)] += part
+                voice.position += len(part)
+            self.voices = [voice for voice in self.voices if voice.position < len(voice.samples)]
+        return np.clip(mix, -32768, 32767).astype(np.int16)
+
+    def _mix_loop(self):
+        while self._running:
+            if not self.voices:
+                self._wakeup.wait()
+                self._wakeup.clear()
+                continue
+            self.sink.write(self._mix())
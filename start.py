@@ -1,13 +1,18 @@
+import os
+
 from multiprocessing import Process, Queue
 
+from config import TELEMETRY_NAME
+
 import game, assistant
 
 if __name__ == "__main__":
     assistant_send_queue = Queue()
     assistant_receive_queue = Queue()
+    telemetry_name = f"{TELEMETRY_NAME}_{os.getpid()}"
 
-    game_process = Process(target=game.run, args=(assistant_receive_queue, assistant_send_queue))
-    assistant_process = Process(target=assistant.run, args=(assistant_send_queue, assistant_receive_queue))
+    game_process = Process(target=game.run, args=(assistant_receive_queue, assistant_send_queue, telemetry_name))
+    assistant_process = Process(target=assistant.run, args=(assistant_send_queue, assistant_receive_queue, telemetry_name))
 
     game_process.start()
     assistant_process.start()
@@ -0,0 +1,94 @@
+import time
+import struct
+
+from dataclasses import dataclass
+from multiprocessing import shared_memory, resource_tracker
+
+
+# 固定布局：序号、帧数、分数、是否暂停、玩家徽章数、其他徽章数、休眠徽章数、粒子数、物理ms、绘制ms、FPS、发布时间
+LAYOUT = struct.Struct("<IQqBIIIIfffd")
+
+
+@dataclass()
+class Telemetry:
+    frame: int
+    score: int
+    paused: bool
+    players: int
+    others: int
+    sleeping: int
+    particles: int
+    physics_ms: float
+    draw_ms: float
+    fps: float
+    time: float
+
+    @property
+    def age(self) -> float:
+        """ 距离游戏最后一次发布经过的秒数 """
+        return time.time() - self.time
+
+
+class TelemetryWriter:
+    """
+    游戏端：每帧把运行数据写入一块固定布局的共享内存，不经过任何队列。
+    写入前后各把序号加一，读取方看到奇数或前后不一致的序号时重读。
+    """
+
+    def __init__(self, name: str):
+        self.shm = shared_memory.SharedMemory(name=name, create=True, size=LAYOUT.size)
+        self.buf = self.shm.buf
+        self.seq = 0
+        self.buf[:LAYOUT.size] = bytes(LAYOUT.size)
+
+    def publish(self, frame, score, paused, players, others, sleeping, particles, physics_ms, draw_ms, fps):
+        self.seq += 1
+        struct.pack_into("<I", self.buf, 0, self.seq)
+        LAYOUT.pack_into(
+            self.buf, 0, self.seq,
+            frame, score, paused, players, others, sleeping, particles, physics_ms, draw_ms, fps, time.time()
+        )
+        self.seq += 1
+        struct.pack_into("<I", self.buf, 0, self.seq)
+
+    def close(self):
+        self.buf = None
+        self.shm.close()
+        self.shm.unlink()
+
+
+class TelemetryReader:
+    """ 辅助端：按需连接共享内存并读取最新的一帧数据，游戏未运行时返回None """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.shm = None
+
+    def read(self, retries: int = 100) -> Telemetry | None:
+        if self.shm is None and not self._attach():
+            return None
+
+        for _ in range(retries):
+            seq, *values = LAYOUT.unpack_from(self.shm.buf)
+            (seq_after,) = struct.unpack_from("<I", self.shm.buf)
+            if seq % 2 == 0 and seq == seq_after:
+                if not seq:
+                    return None
+                stats = Telemetry(*values)
+                stats.paused = bool(stats.paused)
+                return stats
+        return None
+
+    def close(self):
+        if self.shm is not None:
+            self.shm.close()
+            self.shm = None
+
+    def _attach(self) -> bool:
+        try:
+            self.shm = shared_memory.SharedMemory(name=self.name)
+        except FileNotFoundError:
+            return False
+        # *共享内存归游戏进程所有，避免本进程退出时被resource_tracker删除
+        resource_tracker.unregister(self.shm._name, "shared_memory")
+        return True
@@ -1,12 +1,297 @@
+import os
 import pickle
+import time
 import sqlite3
 import datetime
+import threading
 
+from dataclasses import dataclass
+from contextlib import contextmanager
 
+from config import DATABASE_PATH, DATABASE_TIMEOUT
 from models import User, Record, Progress
 
-conn = sqlite3.connect("aaa.db")
-cursor = conn.cursor()
+
+class StatementCache:
+    """
+    Builds the SQL text for each statement shape (table, columns, condition keys) once.
+    Identical SQL text lets sqlite3 reuse its compiled statement from the connection's
+    statement cache, so a repeated call only binds values and steps.
+    Column names are checked against the table schema when a shape is first built, so a
+    misspelled column fails with a clear ValueError instead of an SQL syntax error.
+    Schemas differ between database files, so each ConnectionManager owns one cache
+    (see statements_for).
+    """
+
+    def __init__(self):
+        self._statements = {}
+        self._schemas = {}
+        self.builds = 0
+
+    def insert(self, cursor, table: str, columns: tuple) -> str:
+        key = ("insert", table, columns)
+        command = self._statements.get(key)
+        if command is None:
+            self._validate(cursor, table, columns)
+            command = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+            command = self._store(key, command)
+        return command
+
+    def update(self, cursor, table: str, columns: tuple, condition: tuple) -> str:
+        key = ("update", table, columns, condition)
+        command = self._statements.get(key)
+        if command is None:
+            self._validate(cursor, table, columns + condition)
+            command = f"UPDATE {table} SET {self._assignments(columns, ', ')} WHERE {self._assignments(condition, ' AND ')}"
+            command = self._store(key, command)
+        return command
+
+    def select(self, cursor, table: str, fields: tuple, condition: tuple = ()) -> str:
+        key = ("select", table, fields, condition)
+        command = self._statements.get(key)
+        if command is None:
+            self._validate(cursor, table, fields + condition)
+            command = f"SELECT {', '.join(fields)} FROM {table}"
+            if condition:
+                command += f" WHERE {self._assignments(condition, ' AND ')}"
+            command = self._store(key, command)
+        return command
+
+    def upsert(self, cursor, table: str, columns: tuple, conflict: tuple) -> str:
+        """Insert, or update the non-conflict columns when a row with the same conflict key exists.
+        The conflict columns must be the primary key or covered by a UNIQUE index."""
+        key = ("upsert", table, columns, conflict)
+        command = self._statements.get(key)
+        if command is None:
+            self._validate(cursor, table, columns + conflict)
+            command = self.insert(cursor, table, columns) + f" ON CONFLICT ({', '.join(conflict)}) DO "
+            updates = [column for column in columns if column not in conflict]
+            if updates:
+                command += "UPDATE SET " + ", ".join(f"{column} = excluded.{column}" for column in updates)
+            else:
+                command += "NOTHING"
+            command = self._store(key, command)
+        return command
+
+    def invalidate(self, table: str = None):
+        """Forget the schema and statements of one table, or of all tables."""
+        if table is None:
+            self._schemas.clear()
+            self._statements.clear()
+            return
+        self._schemas.pop(table, None)
+        for key in [key for key in self._statements if key[1] == table]:
+            del self._statements[key]
+
+    def columns(self, cursor, table: str) -> frozenset:
+        schema = self._schemas.get(table)
+        if schema is None:
+            rows = cursor.execute(f"PRAGMA table_info({table})").fetchall()
+            if not rows:
+                raise ValueError(f"no such table: {table}")
+            schema = self._schemas[table] = frozenset(row[1] for row in rows)
+        return schema
+
+    def _validate(self, cursor, table: str, names: tuple):
+        if not names:
+            raise ValueError("at least one column should be given")
+        names = set(names) - {"*"}
+        unknown = names - self.columns(cursor, table)
+        if unknown:
+            # The table may have been altered since its schema was read
+            self._schemas.pop(table, None)
+            unknown = names - self.columns(cursor, table)
+        if unknown:
+            raise ValueError(f"no such column in {table}: {', '.join(sorted(unknown))}")
+
+    def _store(self, key, command: str) -> str:
+        self._statements[key] = command
+        self.builds += 1
+        return command
+
+    @staticmethod
+    def _assignments(names: tuple, separator: str) -> str:
+        return separator.join(f"{name} = ?" for name in names)
+
+
+class Connection(sqlite3.Connection):
+    """A sqlite3 connection that carries the statement cache of the manager that opened it."""
+    statements: StatementCache = None
+
+
+def statements_for(cursor) -> StatementCache:
+    """Return the statement cache for the cursor's database.
+    Connections not opened by a ConnectionManager get a throwaway cache, so each call is
+    validated against its own database."""
+    return getattr(cursor.connection, "statements", None) or StatementCache()
+
+
+class ConnectionManager:
+    """
+    Lazily opens one SQLite connection per thread (and per process), so importing this module
+    touches nothing on disk. Connections use WAL journaling: readers never block the writer
+    and the writer never blocks readers.
+    """
+
+    PRAGMAS = {
+        "journal_mode": "WAL",
+        # WAL with synchronous=NORMAL only syncs at checkpoints and stays consistent after a crash
+        "synchronous": "NORMAL",
+        "temp_store": "MEMORY",
+        "cache_size": -4000,
+    }
+
+    # Compiled statements kept per connection, keyed by SQL text (see StatementCache)
+    CACHED_STATEMENTS = 256
+
+    def __init__(self, path: str = DATABASE_PATH, timeout: float = DATABASE_TIMEOUT):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections = []
+        self._pid = os.getpid()
+        # Statement shapes validated against this manager's database
+        self.statements = StatementCache()
+
+    def connection(self) -> sqlite3.Connection:
+        """Return this thread's connection, opening it on first use."""
+        if self._pid != os.getpid():
+            # A forked child must not reuse the parent's connections
+            self._local = threading.local()
+            self._connections = []
+            self._pid = os.getpid()
+
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.timeout, check_same_thread=False,
+                                   cached_statements=self.CACHED_STATEMENTS, factory=Connection)
+            conn.statements = self.statements
+            for name, value in self.PRAGMAS.items():
+                conn.execute(f"PRAGMA {name} = {value}")
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    def cursor(self) -> sqlite3.Cursor:
+        return self.connection().cursor()
+
+    @contextmanager
+    def transaction(self):
+        """Run the block in one transaction on this thread's connection, committing or rolling back at the end."""
+        conn = self.connection()
+        try:
+            yield conn.cursor()
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    def close(self):
+        """Close this thread's connection."""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            self._local.conn = None
+            with self._lock:
+                self._connections.remove(conn)
+            conn.close()
+
+    def close_all(self):
+        """Close the connections of all threads, e.g. on exit."""
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            conn.close()
+        self._local = threading.local()
+
+
+db = ConnectionManager()
+
+
+@dataclass()
+class FlushResult:
+    rows: int
+    statements: int
+    ms: float
+
+
+class UnitOfWork:
+    """
+    Collects inserts, updates and upserts and writes them in a single transaction.
+    Writes of the same shape (table, columns, condition keys) are grouped and sent with one
+    executemany, in the order the shapes were first queued. A failed flush rolls back,
+    keeps the queued writes and re-raises.
+    Example:
+        with UnitOfWork() as work:
+            work.add_user(user)
+            work.insert("record", {"user_id": 1, "value": 64, "record_time": "..."})
+    """
+
+    def __init__(self, manager: ConnectionManager = None):
+        self.manager = manager or db
+        self._pending = {}
+        self.last: FlushResult | None = None
+
+    def __len__(self):
+        return sum(len(rows) for rows in self._pending.values())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is None:
+            self.flush()
+
+    def insert(self, table: str, data: dict):
+        self._queue(("insert", table, tuple(data), ()), tuple(data.values()))
+
+    def update(self, table: str, data: dict, condition: dict):
+        self._queue(("update", table, tuple(data), tuple(condition)), (*data.values(), *condition.values()))
+
+    def upsert(self, table: str, data: dict, conflict: tuple):
+        self._queue(("upsert", table, tuple(data), tuple(conflict)), tuple(data.values()))
+
+    def add_user(self, user: User):
+        """Update the user's name and password, then queue its progress and records."""
+        if not user:
+            return
+        if user.name and user.password:
+            self.update("user", {"name": user.name, "password": user.password}, {"id": user.id})
+        self.add_progress(user.progress)
+        for record in user.records or ():
+            self.add_record(record)
+
+    def add_record(self, record: Record):
+        if record and record.user_id and record.value and record.record_time:
+            self.update("record", {"value": record.value, "record_time": record.record_time}, {"user_id": record.user_id})
+
+    def add_progress(self, progress: Progress):
+        if progress and progress.progress_file and progress.user_id:
+            self.update("progress", {"progress_file": progress.progress_file}, {"user_id": progress.user_id})
+
+    def flush(self) -> FlushResult:
+        start = time.perf_counter()
+        rows = 0
+        if self._pending:
+            with self.manager.transaction() as cursor:
+                statements = statements_for(cursor)
+                for (kind, table, columns, keys), params in self._pending.items():
+                    if kind == "insert":
+                        command = statements.insert(cursor, table, columns)
+                    else:
+                        command = getattr(statements, kind)(cursor, table, columns, keys)
+                    cursor.executemany(command, params)
+                    rows += len(params)
+        self.last = FlushResult(rows=rows, statements=len(self._pending), ms=(time.perf_counter() - start) * 1000)
+        self._pending = {}
+        return self.last
+
+    def _queue(self, shape: tuple, params: tuple):
+        if not shape[2]:
+            raise ValueError("data should be given")
+        self._pending.setdefault(shape, []).append(params)
+
 
 class UtilDatabase:
     """
@@ -64,6 +349,7 @@ class UtilDatabase:
         tables = cursor.fetchall()
         for table_name in tables:
             cursor.execute(f"DROP TABLE IF EXISTS {table_name[0]}")
+        statements_for(cursor).invalidate()
 
     @staticmethod
     def create_table(cursor, name, fields: dict):
@@ -75,47 +361,29 @@ class UtilDatabase:
             command += f"{field_name} {field_type}, "
         command = command[:-2] + ")"
         cursor.execute(command)
+        statements_for(cursor).invalidate(name)
 
     @staticmethod
     def insert_data(cursor, data_name: str = None, data: dict = None):
         if data_name is None or data is None:
             raise ValueError("data_name and data should be given")
-        command_prefix = f"INSERT INTO {data_name} "
-
-        data_list = []
-        data_length = 0
-
-        for key in data.keys():
-            data_list.append(key)
-            data_length += 1
-
-        command = command_prefix + str(tuple(data_list)).replace("'", "") + " VALUES (" + "?," * (data_length - 1) + "?)"
-        values = [data[key] for key in data.keys()]
-
-        cursor.execute(command, values)
+        command = statements_for(cursor).insert(cursor, data_name, tuple(data))
+        cursor.execute(command, tuple(data.values()))
 
     @staticmethod
     def update_data(cursor, data_name: str = None, data: dict = None, condition: dict = None):
         if data_name is None or data is None or condition is None:
             raise ValueError("data_name, data, and condition should be given")
-        
-        command_prefix = f"UPDATE {data_name} SET "
-        set_clause = ", ".join([f"{key} = ?" for key in data.keys()])
-        where_clause = " AND ".join([f"{key} = ?" for key in condition.keys()])
-        
-        command = f"{command_prefix}{set_clause} WHERE {where_clause}"
-        values = list(data.values()) + list(condition.values())
-
-        cursor.execute(command, values)
+        command = statements_for(cursor).update(cursor, data_name, tuple(data), tuple(condition))
+        cursor.execute(command, (*data.values(), *condition.values()))
 
     @staticmethod
     def select_data(cursor, data_name: str = None, fields: list = None, condition: dict = None):
         if data_name is None or fields is None:
             raise ValueError("data_name and fields should be given")
-        command_prefix = f"SELECT {', '.join(fields)} FROM {data_name} "
-        command = command_prefix + "WHERE " + " AND ".join([f"{key} = ?" for key in condition.keys()]) if condition else ""
-
-        cursor.execute(command, (*condition.values(),))
+        condition = condition or {}
+        command = statements_for(cursor).select(cursor, data_name, tuple(fields), tuple(condition))
+        cursor.execute(command, tuple(condition.values()))
 
         return cursor.fetchall()
     
@@ -155,8 +423,8 @@ class UtilDatabase:
 
 class UtilDataclass:
     @staticmethod
-    def construct_user(conn, name: str, password: str):
-        res = UtilDatabase.safe_select_data(conn, cursor, "user",
+    def construct_user(name: str, password: str):
+        res = UtilDatabase.safe_select_data(db.connection(), db.cursor(), "user",
             ["id", "name"], {"name": name, "password": password})
         
         if not res: return None
@@ -164,7 +432,7 @@ class UtilDataclass:
 
     @staticmethod
     def construct_records(user_id: int):
-        res = UtilDatabase.safe_select_data(conn, cursor, "record",
+        res = UtilDatabase.safe_select_data(db.connection(), db.cursor(), "record",
             ["value", "record_time"], {"user_id": user_id})
         
         records = []
@@ -174,34 +442,36 @@ class UtilDataclass:
     
     @staticmethod
     def construct_progresses_from_database(user_id: int):
-        res = UtilDatabase.safe_select_data(conn, cursor, "progress",
+        res = UtilDatabase.safe_select_data(db.connection(), db.cursor(), "progress",
             ["progress_file"], {"user_id": user_id})
         
         if res: return Progress(user_id=user_id, progress_file=res[0][0])
 
     @staticmethod
     def update_user_to_database(user: User):
-        user and user.name and user.password and \
-        UtilDatabase.safe_update_data(conn, cursor, "user",
-                     {"name": user.name, "password": user.password}, {"id": user.id})
-        
-        UtilDataclass.update_progress_to_database(user.progress)
-
-        if not user.records: return
-        for record in user.records:
-            UtilDataclass.update_record_to_database(record)
+        """Write the user, its progress and all its records in one transaction."""
+        work = UnitOfWork()
+        work.add_user(user)
+        return UtilDataclass.safe_flush(work)
         
     @staticmethod
     def update_record_to_database(record: Record):
-        record and record.user_id and record.value and record.record_time and \
-        UtilDatabase.safe_update_data(conn, cursor, "record",
-                {"value": record.value, "record_time": record.record_time}, {"user_id": record.user_id})
+        work = UnitOfWork()
+        work.add_record(record)
+        return UtilDataclass.safe_flush(work)
 
     @staticmethod
     def update_progress_to_database(progress: Progress):
-        progress and progress.progress_file and progress.user_id and \
-        UtilDatabase.safe_update_data(conn, cursor, "progress",
-                {"progress_file": progress.progress_file}, {"user_id": progress.user_id})
+        work = UnitOfWork()
+        work.add_progress(progress)
+        return UtilDataclass.safe_flush(work)
+
+    @staticmethod
+    def safe_flush(work: UnitOfWork):
+        try:
+            return work.flush()
+        except Exception as e:
+            print(f"Error: {e}")
         
 class UtilProgress:
     @staticmethod
@@ -219,27 +489,43 @@ class UtilProgress:
         with open(progress_file, "wb") as f:
             pickle.dump(data, f)
 
-        UtilDatabase.safe_update_data(conn, cursor, "progress", 
+        UtilDatabase.safe_update_data(db.connection(), db.cursor(), "progress", 
                                             {"progress_file": progress_file}, {"user_id": user.id})
 
     @staticmethod
     def get_owner(progress: Progress):
-        return UtilDatabase.safe_select_data(conn, cursor, "user", ["name"], {"id": progress.user_id})[0][0]
+        return UtilDatabase.safe_select_data(db.connection(), db.cursor(), "user", ["name"], {"id": progress.user_id})[0][0]
 
 class UtilRecord:
     @staticmethod
     def get_owner(record: Record):
         # 通过逻辑运算的短路特性，如果record为None，不会执行后面的查询操作
         return record and \
-        UtilDatabase.safe_select_data(conn, cursor, "user", ["name"], {"id": record.user_id})[0][0]
+        UtilDatabase.safe_select_data(db.connection(), db.cursor(), "user", ["name"], {"id": record.user_id})[0][0]
 
     @staticmethod
     def generate_time(record: Record):
         if record: record.record_time = datetime.datetime.now().strftime("%Y-%m-%d-%H:%M")
     
+    @staticmethod
+    def get_owners(user_ids, cursor=None) -> dict:
+        """Map each user id to its name with a single query instead of one query per record.
+        Pass a cursor to query a database other than the default one."""
+        user_ids = list(set(user_ids))
+        if not user_ids:
+            return {}
+        command = f"SELECT id, name FROM user WHERE id IN ({', '.join('?' * len(user_ids))})"
+        return dict((cursor or db.cursor()).execute(command, user_ids).fetchall())
+
     def format(record: Record):
         if record: return f"{UtilRecord.get_owner(record)}: {record.value} at {record.record_time}"
 
+    @staticmethod
+    def format_all(records: list[Record]) -> list[str]:
+        """Format many records with one owner lookup in total."""
+        owners = UtilRecord.get_owners(record.user_id for record in records if record)
+        return [f"{owners.get(record.user_id)}: {record.value} at {record.record_time}" for record in records if record]
+
 class UtilUser:
     @staticmethod
     def change_password(user: User, new_password: str):